@@ -0,0 +1,117 @@
+# std lib
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from os import listdir, walk
+from os.path import isfile, join
+
+# pip install
+import pygame as pg
+
+# local
+from settings import *
+from texture_cache import get_texture_cache
+
+# Process-wide image (and sound) registry, keyed by path. Every sprite, npc and texture that asks for the same file
+# gets the same decoded Surface, and because the registry outlives Game.new_game() a restart doesn't decode anything
+# again. At launch preload() decodes the files in background threads while Game.load_assets() shows a loading screen.
+# Shared Surfaces must never be drawn on; instances keep their own animation state (see AnimatedSprite.get_images)
+_images = {}         # path -> Surface
+_scaled_images = {}  # (path, size, smooth) -> Surface
+_folders = {}        # folder path -> list of image paths in it
+_sounds = {}         # path -> pg.mixer.Sound
+_decoding = {}       # path -> Future of the file as decoded by preload(): a Surface, not yet converted, or a Sound
+
+
+def get_asset_paths():
+    # every image and sound file under ASSET_DIRS, for preload()
+    return [join(folder, file_name) for path in ASSET_DIRS for folder, _dirs, file_names in sorted(walk(path))
+            for file_name in sorted(file_names) if file_name.endswith(ASSET_EXTENSIONS)]
+
+
+def preload(paths, workers=ASSET_LOAD_WORKERS):
+    # Start decoding the files in a pool of threads (pygame lets go of the GIL while it decodes) and return the
+    # futures; the load functions below pick up the results as they're asked for. Skips what's loaded already,
+    # and images whose scaled versions all come out of the texture cache. That only holds while nothing loads
+    # those files at full size (load_image) too: the walls and the weapon go through load_scaled_image() alone,
+    # and tests/test_assets.py checks a warm start decodes nothing on the main thread
+    texture_cache = get_texture_cache()
+    paths = [path for path in paths if path not in _images and path not in _sounds and path not in _decoding
+             and not (texture_cache and texture_cache.has_source(path))]
+    if not paths:
+        return []
+    executor = ThreadPoolExecutor(workers)
+    for path in paths:
+        _decoding[path] = executor.submit(decode, path)
+    executor.shutdown(wait=False)   # its threads finish the queue, then exit
+    return [_decoding[path] for path in paths]
+
+
+def decode(path):
+    # the file's contents, ready for the main thread: convert_alpha() needs the display, so that's left to it
+    if path.endswith(SOUND_EXTENSIONS):
+        return pg.mixer.Sound(path)
+    return pg.image.load(path)
+
+
+def take_decoded(path):
+    # the file decoded by preload() (waiting for it if need be), or decoded now if it wasn't preloaded
+    future = _decoding.pop(path, None)
+    return future.result() if future else decode(path)
+
+
+def load_image(path):
+    image = _images.get(path)
+    if image is None:
+        image = _images[path] = take_decoded(path).convert_alpha()
+    return image
+
+
+def load_scaled_image(path, size, smooth=False):
+    size = int(size[0]), int(size[1])   # pg.transform truncates float sizes the same way
+    key = path, size, smooth
+    image = _scaled_images.get(key)
+    if image is None:
+        # next stop is the on-disk cache of pre-scaled pixels, then decoding and scaling the file itself
+        texture_cache = get_texture_cache()
+        image = texture_cache.get(path, size, smooth) if texture_cache else None
+        if image is None:
+            scale = pg.transform.smoothscale if smooth else pg.transform.scale
+            # don't register the full-size original just to scale it once (wall textures are 1024px squares)
+            source = _images.get(path) or take_decoded(path).convert_alpha()
+            image = scale(source, size)
+            if texture_cache:
+                texture_cache.put(path, size, smooth, image)
+        _scaled_images[key] = image
+    return image
+
+
+def get_image_size(path):
+    # (width, height) of an image file without decoding it: a PNG has them right after its signature, in the IHDR
+    # chunk. Anything else is decoded (and kept, see load_image)
+    image = _images.get(path)
+    if image is None:
+        with open(path, 'rb') as file:
+            header = file.read(24)
+        if header[:8] == b'\x89PNG\r\n\x1a\n' and header[12:16] == b'IHDR':
+            return struct.unpack('>II', header[16:24])
+        image = load_image(path)
+    return image.get_size()
+
+
+def get_folder(path):
+    # image paths in a folder, in listdir order as AnimatedSprite.get_images has always used
+    paths = _folders.get(path)
+    if paths is None:
+        paths = _folders[path] = [join(path, file_name) for file_name in listdir(path) if isfile(join(path, file_name))]
+    return paths
+
+
+def load_folder(path):
+    return [load_image(full_path) for full_path in get_folder(path)]
+
+
+def load_sound(path):
+    sound = _sounds.get(path)
+    if sound is None:
+        sound = _sounds[path] = take_decoded(path)
+    return sound
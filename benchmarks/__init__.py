@@ -0,0 +1,9 @@
+# std lib
+import os
+
+# every benchmark is run as a module of this package (python -m benchmarks.<name>), so this runs before any of them
+# imports pygame (map.py and main do): SDL picks its drivers when pygame initialises, and the dummy ones let the
+# benchmarks run without a display or sound card, with stdout kept clean for their reports
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
@@ -0,0 +1,91 @@
+# Chunk maps (MAP_PATH in settings.py): checks that a generated world reads back tile for tile from its chunk map
+# file, then compares what loading it costs the old way - world_map and moves_dict built for every tile up front -
+# with a Map on the chunk file, which only loads the chunks around the player. Exits with status 1 on any mismatch.
+# run from the repo root:  python -m benchmarks.chunk_map [--size N]
+
+# std lib
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+# pip install
+import numpy as np
+
+# local
+import map as map_module
+from chunk_map import ChunkMap, generate_map, write_chunk_map
+
+ROUTES = [-1, -1], [-1, 0], [-1, 1], [0, -1], [0, 1], [1, -1], [1, 0], [1, 1]
+DICTS_MAX_SIZE = 1000   # build_dicts() of a much bigger world doesn't fit in memory (that being the point)
+
+
+def build_dicts(grid):
+    # what Map.get_map and PathFinding.get_moves_dict used to build from a list-literal map before the first frame
+    rows = grid.tolist()
+    world_map = {(x, y): value for y, row in enumerate(rows) for x, value in enumerate(row) if value}
+    height, width = grid.shape
+    moves_dict = {(x, y): [(x + rx, y + ry) for rx, ry in ROUTES
+                           if not (0 <= y + ry < height and 0 <= x + rx < width and rows[y + ry][x + rx])]
+                  for y, row in enumerate(rows) for x, value in enumerate(row) if not value}
+    return world_map, moves_dict
+
+
+def measure(build):
+    # ms to build, then MiB at peak in a second build (tracemalloc slows allocating down too much to time it)
+    start = perf_counter()
+    build()
+    elapsed = perf_counter() - start
+    tracemalloc.start()
+    build()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed * 1000, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description='chunk map parity and load cost')
+    parser.add_argument('--size', type=int, default=1000, help='width and height of the generated world in tiles')
+    args = parser.parse_args()
+
+    grid = generate_map(args.size, args.size)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'world.map')
+        write_chunk_map(path, grid)
+
+        # parity: every chunk of the file, put back together
+        chunk_map = ChunkMap(path)
+        read_back = np.zeros_like(grid)
+        size = chunk_map.chunk_size
+        for chunk_y in range(chunk_map.chunks_y):
+            for chunk_x in range(chunk_map.chunks_x):
+                chunk = chunk_map.read_chunk(chunk_x, chunk_y)
+                read_back[chunk_y * size:chunk_y * size + chunk.shape[0],
+                          chunk_x * size:chunk_x * size + chunk.shape[1]] = chunk
+        mismatches = int(np.count_nonzero(read_back != grid))
+        del chunk   # a view of the file, which has to go before it can close
+        chunk_map.close()
+        print(f'{args.size}x{args.size} tiles, {mismatches} tiles read back differently')
+
+        # load cost. tracemalloc counts all of Map.grid, though the OS only hands out its pages as chunks are
+        # copied in: the resident cost of a chunk map is what's loaded, the rest is address space
+        if args.size <= DICTS_MAX_SIZE:
+            elapsed, peak = measure(lambda: build_dicts(grid))
+            print(f'world_map + moves_dict up front: {elapsed:8.1f} ms {peak:8.1f} MiB')
+        else:
+            print(f'world_map + moves_dict up front: skipped above {DICTS_MAX_SIZE}x{DICTS_MAX_SIZE}')
+
+        map_module.MAP_PATH = path
+        elapsed, peak = measure(lambda: map_module.Map(None))
+        game_map = map_module.Map(None)
+        loaded = len(game_map.loaded_chunks) * size ** 2
+        print(f'chunk map, around the player:    {elapsed:8.1f} ms {peak:8.1f} MiB  '
+              f'({len(game_map.loaded_chunks)} chunks, {loaded / grid.size:.1%} of the map)')
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
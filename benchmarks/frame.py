@@ -0,0 +1,118 @@
+# Headless frame benchmark: runs the full Game frame pipeline without a window or audio device,
+# walking the player along a scripted path through the map, and reports per-stage frame times as JSON.
+# run from the repo root:  python -m benchmarks.frame [--frames N] [--warmup N] [--output FILE]
+
+# std lib
+import argparse
+import json
+from math import atan2, sin, tau
+from time import perf_counter
+
+# pip install
+import numpy as np
+import pygame as pg
+
+# local
+from main import Game
+from settings import *
+
+# mini_map coords of a walk through every room: start room, the corridor south, the middle room,
+# down through the gap in row 21 and across the bottom room. Kept off the .0/.5 lines the NPCs stand on:
+# NPC.player_has_LOS divides by sin/cos of the angle to the player, which is 0 when they line up exactly
+WAYPOINTS = [(1.4, 6.4), (10.4, 6.4), (10.4, 13.4), (4.4, 13.4), (4.4, 26.4), (13.4, 26.4)]
+WALK_SPEED = 0.05       # tiles per frame
+LOOK_AROUND = 0.6       # radians the view sways left and right of the walking direction
+
+
+def scripted_path():
+    # yields one (x, y, angle) pose per frame, walking the waypoints there and back forever
+    route = WAYPOINTS + WAYPOINTS[-2:0:-1]
+    frame = 0
+    while True:
+        for (x0, y0), (x1, y1) in zip(route, route[1:] + route[:1]):
+            heading = atan2(y1 - y0, x1 - x0)
+            steps = max(int(((x1 - x0) ** 2 + (y1 - y0) ** 2) ** 0.5 / WALK_SPEED), 1)
+            for step in range(steps):
+                t = step / steps
+                sway = LOOK_AROUND * sin(frame * 0.03)
+                yield x0 + (x1 - x0) * t, y0 + (y1 - y0) * t, (heading + sway) % tau
+                frame += 1
+
+
+def percentiles(samples):
+    ms = np.array(samples) * 1000
+    return {'p50_ms': round(float(np.percentile(ms, 50)), 3),
+            'p95_ms': round(float(np.percentile(ms, 95)), 3),
+            'p99_ms': round(float(np.percentile(ms, 99)), 3),
+            'mean_ms': round(float(ms.mean()), 3)}
+
+
+def run(frames, warmup):
+    game = Game()
+    game.delta_time = 1000 / FPS    # fixed frame time so movement doesn't depend on how fast we run
+
+    # the stages of Game.update() and Game.draw(), timed one by one. The ray caster's two halves are
+    # called directly, so every frame pays for a full cast no matter how RayCasting.update() would shortcut it
+    stages = {
+        'player.update': lambda: game.player.update(),
+        'ray_casting.ray_cast': lambda: game.ray_casting.ray_cast(),
+        'ray_casting.get_objects_to_render': lambda: game.ray_casting.get_objects_to_render(),
+        'simulate': lambda: game.simulate(),
+        'object_handler.update': lambda: game.object_handler.update(),
+        'weapon.update': lambda: game.weapon.update(),
+        'object_renderer.draw': lambda: game.object_renderer.draw(),
+        'weapon.draw': lambda: game.weapon.draw(),
+        'display.flip': pg.display.flip,
+    }
+    timings = {name: [] for name in stages}
+    frame_times = []
+    path = scripted_path()
+
+    for frame in range(warmup + frames):
+        game.check_events()
+        frame_start = perf_counter()
+        for name, stage in stages.items():
+            start = perf_counter()
+            stage()
+            if frame >= warmup:
+                timings[name].append(perf_counter() - start)
+            if name == 'player.update':
+                # the scripted pose replaces whatever (no) input did
+                game.player.x, game.player.y, game.player.angle = next(path)
+        if frame >= warmup:
+            frame_times.append(perf_counter() - frame_start)
+
+        # the NPCs shoot back; keep the player alive so a game over doesn't restart the run
+        game.player.health = PLAYER_MAX_HEALTH
+
+    return {
+        'frames': frames,
+        'warmup': warmup,
+        'settings': {'RES': RES, 'NUM_RAYS': NUM_RAYS, 'RAY_CAST_BACKEND': RAY_CAST_BACKEND,
+                     'WALL_RENDERER': WALL_RENDERER, 'SIM_RATE': SIM_RATE, 'AI_LOD': AI_LOD},
+        'frame': percentiles(frame_times),
+        'stages': {name: percentiles(samples) for name, samples in timings.items()},
+        # npcs per AI_LOD tier on the last tick, and npc updates per tick each tier got over the whole run
+        'ai_tiers': game.object_handler.ai_tier_counts,
+        'ai_updates_per_tick': {tier: round(updates / max(game.object_handler.ai_ticks, 1), 3)
+                                for tier, updates in game.object_handler.ai_updates.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless per-stage frame time benchmark')
+    parser.add_argument('--frames', type=int, default=600, help='frames to measure')
+    parser.add_argument('--warmup', type=int, default=60, help='frames to run before measuring')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    report = json.dumps(run(args.frames, args.warmup), indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# NPC line of sight: checks that batch_player_has_LOS() (LOS_BACKEND = 'numpy') gives exactly what every
+# NPC.player_has_LOS() gives on the shipped map, then times the two. Exits with status 1 on any mismatch.
+# run from the repo root:  python -m benchmarks.los [--cases N]
+
+# std lib
+import argparse
+import random
+import sys
+from timeit import timeit
+
+# pip install
+import numpy as np
+
+# local
+from main import Game
+from npc import batch_player_has_LOS, LOSCache
+
+REPEAT = 200
+
+
+def place_everyone(game, floor, npcs, rng=random):
+    # player and npcs at random spots on the floor; every third position is put on the tile's .0 / .5 lines,
+    # where the rays run along the grid. rng is the random module or a random.Random (tests/test_los.py uses it too)
+    def spot():
+        x, y = rng.choice(floor)
+        if rng.random() < 1 / 3:
+            return x + rng.choice((0.0, 0.5)), y + rng.choice((0.0, 0.5))
+        return x + rng.random(), y + rng.random()
+
+    game.player.x, game.player.y = spot()
+    game.player.angle = rng.uniform(0, 2 * np.pi)
+    for npc in npcs:
+        npc.x, npc.y = spot()
+    handler = game.object_handler
+    handler.positions = None    # npcs were moved behind its back
+    handler.project_sprites(npcs)
+    for npc in npcs:
+        npc.theta = handler.projection[npc.row][2]
+
+
+def batch(game, npcs):
+    thetas = np.array([npc.theta for npc in npcs])
+    npc_tiles = np.array([npc.map_pos for npc in npcs])
+    return batch_player_has_LOS(game.player.pos, game.player.map_pos, thetas, npc_tiles, game.map.grid).tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NPC line of sight: batch vs per-npc parity and timing')
+    parser.add_argument('--cases', type=int, default=5000, help='random player / npc placements to check')
+    args = parser.parse_args()
+
+    random.seed(0)
+    game = Game()
+    npcs = game.object_handler.npc_list
+    floor = [(x, y) for y, row in enumerate(game.map.tile_rows) for x, tile in enumerate(row) if not tile]
+
+    # parity: every npc of every placement, except where player_has_LOS() itself can't answer (ZeroDivisionError)
+    # LOS_CACHE answers per tile pair rather than exact position, so it is only compared, not checked
+    los_cache = LOSCache(game.map)
+    checked = skipped = mismatches = cache_agrees = 0
+    for case in range(args.cases):
+        place_everyone(game, floor, npcs)
+        cached = los_cache.get_LOS(game.player.map_pos, [npc.map_pos for npc in npcs])
+        for npc, has_LOS, cached_LOS in zip(npcs, batch(game, npcs), cached):
+            try:
+                expected = npc.player_has_LOS()
+            except ZeroDivisionError:
+                skipped += 1
+                continue
+            checked += 1
+            cache_agrees += cached_LOS == expected
+            if has_LOS != expected:
+                mismatches += 1
+                print(f'MISMATCH player {game.player.pos} npc {(npc.x, npc.y)}: batch {has_LOS}, npc {expected}')
+    print(f'{checked} npc rays checked, {mismatches} mismatches, {skipped} skipped (ZeroDivisionError per npc)')
+    print(f'LOS_CACHE (tile middle to tile middle) agrees with the exact LOS {cache_agrees / checked:.1%} of the time')
+
+    # timing: the shipped 8 npcs and crowds of more (the same npcs, repeated), see LOS_BATCH_MIN in settings.py
+    for count in (len(npcs), 16, 24, 32, 200):
+        crowd = [npcs[i % len(npcs)] for i in range(count)]
+        place_everyone(game, floor, npcs)
+        per_npc = timeit(lambda: [npc.player_has_LOS() for npc in crowd], number=REPEAT) / REPEAT * 1000
+        batched = timeit(lambda: batch(game, crowd), number=REPEAT) / REPEAT * 1000
+        print(f'{count:4} npcs: per npc {per_npc:7.3f} ms, batch {batched:7.3f} ms')
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
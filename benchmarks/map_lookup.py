@@ -0,0 +1,40 @@
+# Micro-benchmark: world_map dict lookups vs. the dense Map grids
+# run from the repo root:  python -m benchmarks.map_lookup
+
+# std lib
+from timeit import timeit
+
+# local
+from map import Map
+
+REPEAT = 200
+
+
+def main():
+    game_map = Map(None)    # game is only needed for drawing
+    world_map = game_map.world_map
+    tile_rows = game_map.tile_rows
+    grid = game_map.grid
+
+    # every tile of the map plus its 8 neighbours - roughly what collision and pathfinding ask for
+    rows, cols = grid.shape
+    tiles = [(x + dx, y + dy) for y in range(1, rows - 1) for x in range(1, cols - 1)
+             for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+    cases = {
+        'loop only (baseline)': lambda: [x for x, y in tiles],
+        'world_map dict': lambda: [(x, y) in world_map for x, y in tiles],
+        'tile_rows memoryview': lambda: [tile_rows[y][x] for x, y in tiles],
+        'numpy grid (scalar)': lambda: [grid[y, x] for x, y in tiles],
+    }
+
+    print(f'{len(tiles)} lookups x {REPEAT}  (second column has the loop baseline subtracted)')
+    baseline = None
+    for name, case in cases.items():
+        ns = timeit(case, number=REPEAT) / REPEAT / len(tiles) * 1e9
+        baseline = ns if baseline is None else baseline
+        print(f'{name:<22}{ns:8.1f} ns/lookup{ns - baseline:8.1f} ns')
+
+
+if __name__ == '__main__':
+    main()
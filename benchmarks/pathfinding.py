@@ -0,0 +1,161 @@
+# NPC pathfinding: checks that PathFinding.astar() (PATHFINDING = 'astar') reaches every goal bfs() reaches, along a
+# path no dearer than the one bfs() finds (A* with octile distance finds the shortest), and that following
+# get_hpa_step() ('hpa') step by step gets there too, then times them per search on the shipped map and on generated
+# worlds, where bfs floods its whole search area. Exits with status 1 on any mismatch.
+# run from the repo root:  python -m benchmarks.pathfinding [--searches N] [--size N] [--radius N ...]
+
+# std lib
+import argparse
+import os
+import random
+import sys
+import tempfile
+from timeit import timeit
+from types import SimpleNamespace
+
+# pip install
+import numpy as np
+
+# local
+import map as map_module
+import pathfinding as pathfinding_module
+from chunk_map import generate_map, write_chunk_map
+from pathfinding import DIAGONAL_COST, PathFinding
+from settings import *
+
+REPEAT = 3
+
+
+def make_pathfinding(game_map):
+    # PathFinding only needs the map and the npc locations (none: searches go through empty rooms) from the game
+    return PathFinding(SimpleNamespace(map=game_map, object_handler=SimpleNamespace(npc_locations=set())))
+
+
+def path_cost(came_from, start, goal):
+    # None if the search didn't get to goal
+    if goal not in came_from:
+        return None
+    cost, node = 0, goal
+    while node != start:
+        previous = came_from[node]
+        cost += DIAGONAL_COST if node[0] != previous[0] and node[1] != previous[1] else 1
+        node = previous
+    return cost
+
+
+def random_searches(game_map, count, radius):
+    # (start, goal) pairs of open tiles, start within the search area around goal (the player)
+    rows = game_map.grid.tolist()
+    floor = [(x, y) for y, row in enumerate(rows) for x, tile in enumerate(row) if not tile]
+    searches = []
+    while len(searches) < count:
+        goal = random.choice(floor)
+        x, y = goal[0] + random.randint(-radius, radius), goal[1] + random.randint(-radius, radius)
+        if 0 <= y < len(rows) and 0 <= x < len(rows[0]) and not rows[y][x]:
+            searches.append(((x, y), goal))
+    return searches
+
+
+def hpa_walk_cost(pathfinding, start, goal, limit):
+    # cost of the way get_hpa_step() takes from start to goal, one step at a time; None if a step isn't a move or
+    # it hasn't got there in limit
+    node, cost = start, 0
+    while node != goal and cost <= limit:
+        step = pathfinding.get_hpa_step(node, goal)
+        if step not in pathfinding.moves_dict[node]:
+            return None
+        cost += DIAGONAL_COST if step[0] != node[0] and step[1] != node[1] else 1
+        node = step
+    return cost if node == goal else None
+
+
+def check(pathfinding, searches):
+    # mismatches of astar() (with no expansion budget) and get_hpa_step() against bfs(), and the hpa paths' costs
+    # over the shortest, in total
+    mismatches = 0
+    shortest = hpa = 0
+    for start, goal in searches:
+        bfs_cost = path_cost(pathfinding.bfs(start, goal, pathfinding.moves_dict), start, goal)
+        astar_cost = path_cost(pathfinding.astar(start, goal)[0], start, goal)
+        if (bfs_cost is None) != (astar_cost is None) or (astar_cost is not None and astar_cost > bfs_cost + 1e-9):
+            mismatches += 1
+            print(f'MISMATCH {start} -> {goal}: bfs {bfs_cost} astar {astar_cost}')
+        if astar_cost is not None:
+            hpa_cost = hpa_walk_cost(pathfinding, start, goal, astar_cost * 3 + 10)
+            if hpa_cost is None:
+                mismatches += 1
+                print(f'MISMATCH {start} -> {goal}: hpa never got there')
+            else:
+                shortest += astar_cost
+                hpa += hpa_cost
+    return mismatches, hpa / shortest - 1 if shortest else 0
+
+
+def time_searches(pathfinding, searches):
+    # ms per search for bfs(), astar() and get_hpa_step() (every search for a new goal, so the hpa ones don't get
+    # to reuse get_goal_edges() the way npcs chasing the player do), and the tiles bfs and astar reach on average
+    def ms(search):
+        return timeit(lambda: [search(start, goal) for start, goal in searches], number=REPEAT) / REPEAT \
+            / len(searches) * 1000
+    bfs_ms = ms(lambda start, goal: pathfinding.bfs(start, goal, pathfinding.moves_dict))
+    astar_ms = ms(pathfinding.astar)
+    hpa_ms = ms(pathfinding.get_hpa_step)
+    bfs_tiles = sum(len(pathfinding.bfs(start, goal, pathfinding.moves_dict)) for start, goal in searches)
+    astar_tiles = sum(len(pathfinding.astar(start, goal)[0]) for start, goal in searches)
+    return bfs_ms, astar_ms, hpa_ms, bfs_tiles / len(searches), astar_tiles / len(searches)
+
+
+def report(name, pathfinding, searches):
+    # the clusters of the whole map, as 'hpa' works them out in PathFinding.__init__
+    pathfinding.clusters.clear()
+    build_ms = timeit(pathfinding.build_clusters, number=1) * 1000
+    mismatches, longer = check(pathfinding, searches)
+    bfs_ms, astar_ms, hpa_ms, bfs_tiles, astar_tiles = time_searches(pathfinding, searches)
+    print(f'{name:<28}{bfs_ms:9.3f} ms {bfs_tiles:6.0f} tiles{astar_ms:9.3f} ms {astar_tiles:6.0f} tiles'
+          f'{hpa_ms:9.3f} ms {longer:7.1%} {build_ms:9.1f} ms')
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NPC pathfinding: astar vs bfs parity and timing')
+    parser.add_argument('--searches', type=int, default=500, help='random (npc, player) tile pairs per map')
+    parser.add_argument('--size', type=int, default=512, help='width and height of the generated worlds in tiles')
+    parser.add_argument('--radius', type=int, nargs='+', default=[PATH_SEARCH_RADIUS, 64, 128],
+                        help='PATH_SEARCH_RADIUS values to try on the generated worlds')
+    args = parser.parse_args()
+
+    random.seed(0)
+    # the parity check and the timings both want whole searches, not ones cut short by the budget
+    pathfinding_module.PATH_MAX_EXPANSIONS = None
+    mismatches = 0
+    print(f'{"":<28}{"bfs":>25}{"astar":>25}{"hpa":>12}{"longer":>8}{"clusters":>13}')
+
+    # the shipped map
+    pathfinding = make_pathfinding(map_module.Map(None))
+    searches = random_searches(pathfinding.game.map, args.searches, PATH_SEARCH_RADIUS)
+    mismatches += report('shipped map', pathfinding, searches)
+
+    # generated worlds, all of it loaded, with ever bigger search areas: rooms joined by doorways (generate_map()),
+    # and one big open floor, where bfs floods the whole search area and astar goes more or less straight there
+    open_floor = np.zeros((args.size, args.size), np.uint8)
+    open_floor[[0, -1]] = open_floor[:, [0, -1]] = 1
+    with tempfile.TemporaryDirectory() as folder:
+        for name, grid in ('rooms', generate_map(args.size, args.size)), ('open', open_floor):
+            path = os.path.join(folder, f'{name}.map')
+            write_chunk_map(path, grid)
+            map_module.MAP_PATH = path
+            game_map = map_module.Map(None)
+            game_map.load_around(args.size / 2, args.size / 2, args.size)
+            for radius in args.radius:
+                pathfinding_module.PATH_SEARCH_RADIUS = radius
+                pathfinding = make_pathfinding(game_map)
+                searches = random_searches(game_map, args.searches, radius)
+                mismatches += report(f'{args.size}x{args.size} {name}, radius {radius}', pathfinding, searches)
+            game_map.chunk_map.close()
+
+    print(f'{mismatches} mismatches')
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# Multiprocess ray casting (RAY_CAST_BACKEND = 'multiprocess'): checks that RayCastPool casts exactly what the
+# single-process numpy caster does, then times both with more rays (higher RES) and more worker processes.
+# Exits with status 1 on any mismatch.
+# run from the repo root:  python -m benchmarks.ray_pool [--casts N] [--workers 1 2 4 ...]
+
+# std lib
+import argparse
+import os
+import random
+import sys
+from math import tau
+from timeit import timeit
+
+# pip install
+import numpy as np
+
+# local
+from map import Map
+from raycasting import cast_ray_strip, carry_textures, dda_steps
+from ray_pool import RayCastPool
+from settings import *
+
+REPEAT = 50
+NEW_MAP_CASTS = 20
+
+
+def cast_numpy(grid, num_rays, pose):
+    # what RayCasting.ray_cast_numpy() does, for any number of rays across the same FOV
+    player_pos, player_map_pos, player_angle = pose
+    ray_angles = dda_steps(np.array([player_angle - HALF_FOV + 0.0001]), np.array([FOV / num_rays]), num_rays - 1)[0]
+    depth, proj_height, texture_num_vert, texture_num_hor, vert, offset = \
+        cast_ray_strip(grid, player_pos, player_map_pos, player_angle, ray_angles)
+    return depth, proj_height, carry_textures(texture_num_vert, texture_num_hor, vert), offset
+
+
+def random_pose(floor):
+    x, y = random.choice(floor)
+    x, y = x + random.random(), y + random.random()
+    return (x, y), (int(x), int(y)), random.uniform(0, tau)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='multiprocess ray casting: parity and scaling')
+    parser.add_argument('--casts', type=int, default=200, help='random player poses to check')
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, 2, 4, os.cpu_count()}),
+                        help='pool sizes to time')
+    args = parser.parse_args()
+
+    random.seed(0)
+    grid = Map(None).grid   # game is only needed for drawing
+    floor = [(x, y) for y, row in enumerate(grid.tolist()) for x, tile in enumerate(row) if not tile]
+
+    # parity, at the game's NUM_RAYS
+    pool = RayCastPool(workers=max(args.workers))
+    pool.set_grid(grid)
+    mismatches = 0
+    for case in range(args.casts):
+        pose = random_pose(floor)
+        expected, got = cast_numpy(grid, NUM_RAYS, pose), pool.cast(*pose)
+        if any(not np.array_equal(a, b) for a, b in zip(expected, got)):
+            mismatches += 1
+            print(f'MISMATCH player {pose}')
+    # a new game's map: the same shape and version number (both start at 0), other walls
+    new_grid = grid.copy()
+    new_grid[1:-1, 1:-1] = 0
+    pool.set_grid(new_grid)
+    for case in range(NEW_MAP_CASTS):  # (plenty of poses only see the outer walls, which both maps have)
+        pose = random_pose(floor)
+        if any(not np.array_equal(a, b) for a, b in zip(cast_numpy(new_grid, NUM_RAYS, pose), pool.cast(*pose))):
+            mismatches += 1
+            print(f'MISMATCH player {pose} on a new map of the same shape and version')
+    pool.close()
+    print(f'{args.casts} casts of {NUM_RAYS} rays checked, {mismatches} mismatches')
+
+    # scaling: NUM_RAYS is VIEW_WIDTH // 2, so each doubling of the ray count is a doubling of the view's width
+    print(f'{os.cpu_count()} CPUs; ms per cast')
+    print(f'{"rays":>6}{"numpy":>10}' + ''.join(f'{f"{workers} proc":>10}' for workers in args.workers))
+    for num_rays in (NUM_RAYS, NUM_RAYS * 2, NUM_RAYS * 4, NUM_RAYS * 8):
+        pose = random_pose(floor)
+        times = [timeit(lambda: cast_numpy(grid, num_rays, pose), number=REPEAT)]
+        for workers in args.workers:
+            pool = RayCastPool(num_rays, workers)
+            pool.set_grid(grid)
+            pool.cast(*pose)    # warm up: the first cast waits for the workers to start
+            times.append(timeit(lambda: pool.cast(*pose), number=REPEAT))
+            pool.close()
+        print(f'{num_rays:6}' + ''.join(f'{t / REPEAT * 1000:10.3f}' for t in times))
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# Chunked binary map files (MAP_PATH in settings.py), for worlds far bigger than map.py's mini_map.
+# The map is cut into squares of chunk_size x chunk_size tiles, stored one after the other so each chunk is one
+# contiguous read. The file is memory-mapped and Map copies chunks into its grid only as the player and npcs get
+# near them (see Map.load_around), so neither load time nor the memory the game touches grows with the map's size.
+#
+# File layout: HEADER (magic, version, width, height, chunk size), then the chunks row by row, each chunk_size**2
+# texture numbers (uint8, 0 = open space) row by row. Chunks on the right and bottom edges are padded with 0.
+# Write one with:  python chunk_map.py [--generate WIDTH HEIGHT] [--seed N] [--output PATH]
+
+# std lib
+import argparse
+import mmap
+import os
+import struct
+
+# pip install
+import numpy as np
+
+# local
+from settings import *
+
+HEADER = struct.Struct('<4sBIIH')   # magic, version, width, height, chunk size
+MAGIC = b'RCMP'
+VERSION = 1
+ROOM_SIZE = 8   # generate_map(): tiles between the walls of its grid of rooms
+
+
+class ChunkMap:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.width, self.height, self.chunk_size = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f'{path} is not a version {VERSION} chunk map')
+        self.chunks_x = -(-self.width // self.chunk_size)
+        self.chunks_y = -(-self.height // self.chunk_size)
+        # every chunk as a [chunk_y, chunk_x, y, x] view of the mapped file: nothing is read until it's indexed
+        self.chunks = np.frombuffer(self.map, np.uint8, offset=HEADER.size).reshape(
+            self.chunks_y, self.chunks_x, self.chunk_size, self.chunk_size)
+
+
+    def read_chunk(self, chunk_x, chunk_y):
+        # the chunk's tiles, cut off at the right and bottom edges of the map
+        x, y = chunk_x * self.chunk_size, chunk_y * self.chunk_size
+        return self.chunks[chunk_y, chunk_x, :self.height - y, :self.width - x]
+
+
+    def close(self):
+        self.chunks = None  # (the mmap can't close while a view of it is still around)
+        self.map.close()
+
+
+def write_chunk_map(path, grid, chunk_size=MAP_CHUNK_SIZE):
+    # grid: [y, x] texture numbers, 0 = open space
+    height, width = grid.shape
+    chunks_y, chunks_x = -(-height // chunk_size), -(-width // chunk_size)
+    padded = np.zeros((chunks_y * chunk_size, chunks_x * chunk_size), np.uint8)
+    padded[:height, :width] = grid
+    chunks = padded.reshape(chunks_y, chunk_size, chunks_x, chunk_size).swapaxes(1, 2)
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, width, height, chunk_size))
+        file.write(np.ascontiguousarray(chunks).tobytes())
+
+
+def generate_map(width, height, seed=0):
+    # A big world to try chunk maps with: the shipped level (map.py) in the top left corner, where the sprites and
+    # npcs of ObjectHandler stand, with a doorway out into a grid of ROOM_SIZE rooms joined by doorways
+    from map import mini_map
+    rng = np.random.default_rng(seed)
+    grid = np.zeros((height, width), np.uint8)
+    grid[::ROOM_SIZE] = rng.integers(1, 6, (len(grid[::ROOM_SIZE]), width))
+    grid[:, ::ROOM_SIZE] = rng.integers(1, 6, (height, len(grid[0, ::ROOM_SIZE])))
+    rooms_y, rooms_x = -(-height // ROOM_SIZE), -(-width // ROOM_SIZE)
+
+    # a doorway in the wall above and the wall left of every room, somewhere along it
+    room_y, room_x = np.mgrid[0:rooms_y, 0:rooms_x] * ROOM_SIZE
+    door = rng.integers(1, ROOM_SIZE, (2, rooms_y, rooms_x))
+    grid[room_y.ravel(), (room_x + door[0]).clip(0, width - 1).ravel()] = 0
+    grid[(room_y + door[1]).clip(0, height - 1).ravel(), room_x.ravel()] = 0
+    # and a pillar in some of them
+    pillar = rng.random((rooms_y, rooms_x)) < 0.3
+    grid[(room_y + ROOM_SIZE // 2).clip(0, height - 1)[pillar], (room_x + ROOM_SIZE // 2).clip(0, width - 1)[pillar]] = 5
+
+    level = np.array([[value or 0 for value in row] for row in mini_map], np.uint8)
+    grid[:level.shape[0], :level.shape[1]] = level
+    grid[6, level.shape[1] - 1:level.shape[1] + 1] = 0     # the doorway out of the level
+    grid[[0, -1]] = grid[:, [0, -1]] = 1    # the game assumes the map is enclosed by walls
+    return grid
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='write a chunk map file (see MAP_PATH in settings.py)')
+    parser.add_argument('--generate', type=int, nargs=2, metavar=('WIDTH', 'HEIGHT'),
+                        help="a generated world this big around the shipped level, instead of just the level")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=MAP_PATH or 'resources/maps/level.map')
+    args = parser.parse_args()
+
+    if args.generate:
+        grid = generate_map(*args.generate, args.seed)
+    else:
+        from map import mini_map
+        grid = np.array([[value or 0 for value in row] for row in mini_map], np.uint8)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    write_chunk_map(args.output, grid)
+    print(f'{args.output}: {grid.shape[1]}x{grid.shape[0]} tiles in chunks of {MAP_CHUNK_SIZE}')
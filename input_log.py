@@ -0,0 +1,68 @@
+# std lib
+import struct
+
+# pip install
+import pygame as pg
+
+# Binary input log for reproducible runs (see Game.check_events): a header with the RNG seed and the start
+# time, then one fixed-size record per frame with everything the game reads from the outside world that frame
+HEADER = struct.Struct('<4sBQI')    # magic, version, random seed, pg.time ticks when the game was built
+FRAME = struct.Struct('<IHhB')      # ticks, delta_time (ms), mouse rel x, flags (see below)
+MAGIC = b'RCIN'
+VERSION = 1
+
+# the keys Player.movement() reads, in flag bit order; the remaining flag bits follow them
+MOVEMENT_KEYS = pg.K_w, pg.K_a, pg.K_s, pg.K_d
+FIRE_BIT, TRIGGER_BIT, QUIT_BIT = 1 << 4, 1 << 5, 1 << 6
+
+
+class FrameInput:
+    # everything the game takes as input for one frame
+    def __init__(self, ticks, delta_time, keys=None, rel_x=0, fire=False, global_trigger=False, quit=False):
+        self.ticks = ticks
+        self.delta_time = delta_time
+        self.keys = keys if keys is not None else dict.fromkeys(MOVEMENT_KEYS, False)  # indexed like pg.key.get_pressed()
+        self.rel_x = rel_x
+        self.fire = fire
+        self.global_trigger = global_trigger
+        self.quit = quit
+
+
+class InputRecorder:
+    def __init__(self, path, seed, start_ticks):
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed, start_ticks))
+
+
+    def write(self, frame_input):
+        flags = sum(1 << bit for bit, key in enumerate(MOVEMENT_KEYS) if frame_input.keys[key])
+        flags |= FIRE_BIT * frame_input.fire | TRIGGER_BIT * frame_input.global_trigger | QUIT_BIT * frame_input.quit
+        rel_x = max(-32768, min(32767, frame_input.rel_x))
+        self.file.write(FRAME.pack(frame_input.ticks, min(int(frame_input.delta_time), 65535), rel_x, flags))
+
+
+    def close(self):
+        self.file.close()
+
+
+class InputPlayer:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        magic, version, self.seed, self.start_ticks = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} input log')
+
+
+    def read(self):
+        # the next frame's input, or None once the log is used up
+        record = self.file.read(FRAME.size)
+        if len(record) < FRAME.size:
+            return None
+        ticks, delta_time, rel_x, flags = FRAME.unpack(record)
+        keys = {key: bool(flags & 1 << bit) for bit, key in enumerate(MOVEMENT_KEYS)}
+        return FrameInput(ticks, delta_time, keys, rel_x,
+                          bool(flags & FIRE_BIT), bool(flags & TRIGGER_BIT), bool(flags & QUIT_BIT))
+
+
+    def close(self):
+        self.file.close()
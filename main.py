@@ -1,5 +1,6 @@
 # std lib
 import sys
+from random import getrandbits, seed as random_seed   # (npc.py's star import brings in random.random as 'random')
 
 # 3rd party
 import pygame as pg
@@ -15,6 +16,11 @@ from object_handler import *
 from weapon import *
 from sound import *
 from pathfinding import *
+from input_log import *
+from texture_cache import save_texture_cache
+from asset_cache import preload, get_asset_paths
+from ray_pool import RayCastPool
+from profiler import Profiler, PROFILER_KEY
 
 class Game:
     def __init__(self):
@@ -25,17 +31,78 @@ class Game:
         pg.init()
         pg.mouse.set_visible(False)     
         self.screen = pg.display.set_mode(RES)
+        # offscreen Surface the 3-D view is drawn at VIEW_RES, see ObjectRenderer.present_view()
+        self.view = self.screen if VIEW_RES == RES else pg.Surface(VIEW_RES)
         self.clock = pg.time.Clock()
+        # where frame time goes, on screen (PROFILER_KEY) and with command line arg -profile <file.csv> in a file too
+        self.profiler = Profiler(self, sys.argv[sys.argv.index('-profile') + 1] if '-profile' in sys.argv else None)
         self.delta_time = 1 # track the time between frames; used to error correct variable FPS for smooth movement
+        self.ticks = pg.time.get_ticks()    # pg.time ticks at the start of the frame; game code reads time from here
+
+        # record the input of every frame to a file with command line arg -record <file>, and play it back
+        # (same input, frame times and random numbers, so the same game) with -replay <file>. See input_log.py
+        self.input_log = None
+        self.replaying = '-replay' in sys.argv
+        if self.replaying:
+            self.input_log = InputPlayer(sys.argv[sys.argv.index('-replay') + 1])
+            random_seed(self.input_log.seed)
+            self.ticks = self.input_log.start_ticks
+        elif '-record' in sys.argv:
+            seed = getrandbits(64)
+            random_seed(seed)
+            self.input_log = InputRecorder(sys.argv[sys.argv.index('-record') + 1], seed, self.ticks)
+        self.input = FrameInput(self.ticks, self.delta_time)
         # repeating global trigger for timing events; when triggered it adds the custom flag to the event queue
         self.global_trigger = False
         self.global_event = pg.USEREVENT+0  # see check_events() for event handling
         pg.time.set_timer(self.global_event, TIMER_MS)
 
+        # worker processes for RAY_CAST_BACKEND = 'multiprocess'; started once, every new game reuses them
+        self.ray_pool = RayCastPool() if RAY_CAST_BACKEND == 'multiprocess' else None
+
+        self.load_assets()
         self.new_game()
 
 
+    def load_assets(self):
+        # decode every image and sound in ASSET_LOAD_WORKERS threads while this one keeps the window alive with a
+        # progress bar. new_game() then only converts and scales what it uses, and every later new_game() reuses it
+        if not ASSET_LOAD_WORKERS:
+            return
+        pg.mixer.init()     # sounds are decoded into the mixer's format
+        futures = preload(get_asset_paths())
+        font = pg.font.Font(None, LOADING_FONT_SIZE)
+        while True:
+            done = sum(future.done() for future in futures)
+            if self.read_input().quit:
+                self.quit()
+            self.draw_loading_screen(font, done / len(futures) if futures else 1)
+            pg.display.flip()
+            if done == len(futures):
+                break
+            self.clock.tick(FPS)
+
+
+    def draw_loading_screen(self, font, progress):
+        self.screen.fill('black')
+        bar = pg.Rect(0, 0, WIDTH // 2, LOADING_BAR_HEIGHT)
+        bar.center = HALF_WIDTH, HALF_HEIGHT
+        pg.draw.rect(self.screen, LOADING_BAR_COLOR, bar, 2)
+        pg.draw.rect(self.screen, LOADING_BAR_COLOR, (bar.x, bar.y, bar.width * progress, bar.height))
+        text = font.render(f'LOADING {progress:.0%}', True, LOADING_BAR_COLOR)
+        self.screen.blit(text, text.get_rect(midbottom=(HALF_WIDTH, bar.y - LOADING_BAR_HEIGHT)))
+
+
     def new_game(self):
+        # a game over or victory sets this partway through update(); run_frame() starts the next game at the end of
+        # the frame, so nothing still working through this one ever meets the new game's objects
+        self.restart = False
+        # fixed-rate simulation clock (see simulate()): ms of simulation time run so far, the frame time not yet
+        # run as ticks, and how far the current frame is between the last tick and the next one (0..1)
+        self.sim_time = self.ticks
+        self.sim_accumulator = 0
+        self.sim_alpha = 0
+        self.sim_trigger = False    # global_trigger on simulation time: True for ticks that cross a TIMER_MS mark
         self.map = Map(self)
         self.player = Player(self)
         # call renderer before raycaster so raycaster has access to loaded textures
@@ -45,12 +112,16 @@ class Game:
         self.weapon = Weapon(self)
         self.sound = Sound(self)
         self.pathfinding = PathFinding(self)
+        # write any textures scaled for the first time (or rescaled) to the on-disk cache for the next launch
+        save_texture_cache()
 
 
     def update(self):
         # update game objects
+        self.map.update()
         self.player.update()
         self.ray_casting.update()
+        self.simulate()
         self.object_handler.update()
         self.weapon.update()
 
@@ -58,13 +129,34 @@ class Game:
         pg.display.flip()
 
         # returns the time since last frame + ticks frames consistent with 60 FPS (or less)
-        self.delta_time = self.clock.tick(FPS)
+        # (a replay runs as fast as it can, its frame times come from the log)
+        self.delta_time = self.clock.tick(0 if self.replaying else FPS)
 
         # display the framerate as the window caption
         pg.display.set_caption(f'{self.clock.get_fps() :.1f}')
 
 
+    def simulate(self):
+        # Fixed timestep: npc ai, pathfinding and combat (ObjectHandler.tick) run SIM_RATE times a second of frame
+        # time, not once a frame. So they cost the same at any frame rate and play out the same on any machine;
+        # the frames in between draw npcs interpolated between their last two ticks (ObjectHandler.update)
+        self.sim_accumulator += self.delta_time
+        steps = 0
+        while self.sim_accumulator >= SIM_DT and not self.restart:
+            if steps == SIM_MAX_STEPS:
+                self.sim_accumulator = 0
+                break
+            self.sim_trigger = (self.sim_time + SIM_DT) // TIMER_MS > self.sim_time // TIMER_MS
+            self.sim_time += SIM_DT
+            self.sim_accumulator -= SIM_DT
+            steps += 1
+            self.object_handler.tick()    # (a game over or victory in it ends this game's ticks, see run_frame())
+        self.sim_alpha = self.sim_accumulator / SIM_DT
+
+
     def draw(self):
+        if self.restart:
+            return  # the game over / victory screen stays up until the next game's first frame
         if self.topdown:
             self.screen.fill('black')
             self.map.draw()
@@ -72,28 +164,78 @@ class Game:
         else:
             self.object_renderer.draw()
             self.weapon.draw()
+        if self.profiler.enabled:
+            self.profiler.draw()
 
 
     def check_events(self):
-        self.global_trigger = False
+        if self.replaying:
+            self.input = self.input_log.read() or FrameInput(self.ticks, self.delta_time, quit=True)
+            # still drain the event queue so the window stays responsive and can be closed
+            self.input.quit |= self.read_input().quit
+        else:
+            self.input = self.read_input()
+            if self.input_log:
+                self.input_log.write(self.input)
+
+        if self.input.quit:
+            self.quit()
+
+        self.ticks = self.input.ticks
+        self.delta_time = self.input.delta_time
+
+        # flags True every TIMER_MS ms
+        self.global_trigger = self.input.global_trigger
+
+        # trace fire events
+        if self.input.fire:
+            self.player.single_fire_event()
+
+
+    def quit(self):
+        if self.input_log:
+            self.input_log.close()
+        if self.ray_pool:
+            self.ray_pool.close()
+        self.profiler.close()
+        pg.quit()
+        sys.exit()
+
+
+    def read_input(self):
+        # collect this frame's input from pygame: events, the movement keys and relative mouse movement
+        frame_input = FrameInput(pg.time.get_ticks(), self.delta_time)
         for event in pg.event.get():
             if event.type == pg.QUIT or (event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE):
-                pg.quit()
-                sys.exit()
-            
-            # flags True every TIMER_MS ms
+                frame_input.quit = True
             elif event.type == self.global_event:
-                self.global_trigger = True
+                frame_input.global_trigger = True
+            elif event.type == pg.MOUSEBUTTONDOWN and event.button == 1:
+                frame_input.fire = True
+            elif event.type == pg.KEYDOWN and event.key == PROFILER_KEY:
+                self.profiler.toggle()  # (not part of the input log: it changes nothing in the game)
+
+        frame_input.keys = pg.key.get_pressed()
 
-            # trace fire events
-            self.player.single_fire_event(event)
+        # keep the mouse away from the window border, then get relative x-coord mouse movement since previous frame
+        mx, my = pg.mouse.get_pos()
+        if mx < MOUSE_BORDER_LEFT or mx > MOUSE_BORDER_RIGHT:
+            pg.mouse.set_pos([HALF_WIDTH, HALF_HEIGHT])
+        frame_input.rel_x = pg.mouse.get_rel()[0]
+        return frame_input
 
     
+    def run_frame(self):
+        self.check_events()
+        self.update()
+        self.draw()
+        if self.restart:
+            self.new_game()
+
+
     def run(self):
         while True:
-            self.check_events()
-            self.update()
-            self.draw()
+            self.run_frame()
 
 
 if __name__ == '__main__':
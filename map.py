@@ -1,8 +1,13 @@
+# std lib
+from collections.abc import Mapping
+
 # 3rd party
+import numpy as np
 import pygame as pg
 
 # local
 from settings import *
+from chunk_map import ChunkMap
 
 # False means no collidable object in that space
 # 1-5 represents texture number 
@@ -47,17 +52,129 @@ class Map:
         self.game = game
         self.mini_map = mini_map
         self.world_map = {} # set of tuples
+        # the same map as dense grids of texture numbers (0 = open space), both indexed [y][x]:
+        # 'grid' (numpy uint8) for the vectorized code and 'tile_rows' (a memoryview of each of its rows) for
+        # single lookups, which index faster than hashing an (x, y) tuple into world_map.
+        # Neither does a bounds check, so like the rest of the game they assume the map is enclosed by walls
+        self.grid = None
+        self.tile_rows = []
+        # bumped whenever a tile changes, so anything cached from the map's layout knows it has to start over
+        self.version = 0
+        # MAP_PATH: the map comes from a chunk map file instead, a chunk at a time (see load_around)
+        self.chunk_map = ChunkMap(MAP_PATH) if MAP_PATH else None
+        self.loaded_chunks = set()  # (chunk x, chunk y) copied into grid so far
+        self.player_chunk = None    # the chunk the player was in at the last update()
         self.get_map()
 
 
     def get_map(self):
-        for j, row in enumerate(self.mini_map):
-            for i, value in enumerate(row):
-                if value:
-                    self.world_map[(i, j)] = value
+        if self.chunk_map:
+            # all open space to start with; numpy leaves the memory of an array of zeros to the OS, which only
+            # hands it out as load_around() writes chunks in, so a 1000x1000 map costs what the player has seen
+            self.grid = np.zeros((self.chunk_map.height, self.chunk_map.width), dtype=np.uint8)
+            self.world_map = WorldMap(self.grid)
+            self.load_around(*PLAYER_POS, MAP_LOAD_RADIUS)  # where the player starts, before anything looks
+        else:
+            for j, row in enumerate(self.mini_map):
+                for i, value in enumerate(row):
+                    if value:
+                        self.world_map[(i, j)] = value
+            self.grid = np.array([[value or 0 for value in row] for row in self.mini_map], dtype=np.uint8)
+
+        self.tile_rows = [row.data for row in self.grid]
+
+
+    def update(self):
+        # keep the chunks around the player loaded (the rest of the time there's nothing to do)
+        if self.chunk_map:
+            chunk = int(self.game.player.x) // MAP_CHUNK_SIZE, int(self.game.player.y) // MAP_CHUNK_SIZE
+            if chunk != self.player_chunk:
+                self.player_chunk = chunk
+                self.load_around(self.game.player.x, self.game.player.y, MAP_LOAD_RADIUS)
+
+
+    def load_around(self, x, y, radius):
+        # copy the chunks within radius tiles of (x, y) out of the chunk map file into grid, if they aren't already.
+        # Chunks are never unloaded: grid only grows by what the player and npcs get near
+        if not self.chunk_map:
+            return
+        size = self.chunk_map.chunk_size
+        first_x, last_x = max(int(x - radius) // size, 0), min(int(x + radius) // size, self.chunk_map.chunks_x - 1)
+        first_y, last_y = max(int(y - radius) // size, 0), min(int(y + radius) // size, self.chunk_map.chunks_y - 1)
+        for chunk_y in range(first_y, last_y + 1):
+            for chunk_x in range(first_x, last_x + 1):
+                if (chunk_x, chunk_y) not in self.loaded_chunks:
+                    self.loaded_chunks.add((chunk_x, chunk_y))
+                    chunk = self.chunk_map.read_chunk(chunk_x, chunk_y)
+                    top, left = chunk_y * size, chunk_x * size
+                    self.grid[top:top + chunk.shape[0], left:left + chunk.shape[1]] = chunk
+                    self.version += 1
+                    # the moves (and hpa clusters) on and next to the chunk were worked out with it all floor, so
+                    # they're dropped to be found again (tests/test_chunk_map.py)
+                    pathfinding = getattr(self.game, 'pathfinding', None)
+                    if pathfinding:
+                        pathfinding.update_area(left, top, chunk.shape[1], chunk.shape[0])
+
+
+    def set_tile(self, x, y, value):
+        # change a tile while the game runs (a door opening, a wall going up); value is a texture number, 0 clears it.
+        # Costs the same whatever the map's size: world_map and grid (tile_rows are views of it) get the one tile,
+        # the pathfinding drops just the moves next to it, and the version bump tells every cache of the layout
+        # (LOS, rays, the flow field) to start over. On a chunk map the tile's chunk is loaded first, or loading it
+        # later would copy the file's tile back over the change
+        value = value or 0
+        self.load_around(x, y, 0)
+        if self.grid[y, x] == value:
+            return
+        self.grid[y, x] = value
+        if not isinstance(self.world_map, WorldMap):    # (a chunk map's world_map reads grid)
+            if value:
+                self.world_map[(x, y)] = value
+            else:
+                self.world_map.pop((x, y), None)
+        self.version += 1
+        pathfinding = getattr(self.game, 'pathfinding', None)   # (new_game() builds the map before the pathfinding)
+        if pathfinding:
+            pathfinding.update_tile(x, y)
+
+
+    def clear_tile(self, x, y):
+        self.set_tile(x, y, 0)
+
+
+    def get_tile(self, x, y):
+        # bounds-checked lookup for code outside the hot paths; tiles off the map are open space like in world_map
+        if 0 <= y < len(self.tile_rows) and 0 <= x < len(self.tile_rows[y]):
+            return self.tile_rows[y][x]
+        return 0
 
 
     def draw(self):
 
         [pg.draw.rect(self.game.screen, 'darkgray', (pos[0] * TILEPX, pos[1] * TILEPX, TILEPX, TILEPX), 2) 
             for pos in self.world_map]
+
+
+
+class WorldMap(Mapping):
+    # world_map of a chunk map: {(x, y): texture number} of the walls, read from grid as it's asked for
+    # instead of built up front (which for a big map would take longer, and far more memory, than the grid)
+    def __init__(self, grid):
+        self.grid = grid
+
+
+    def __getitem__(self, pos):
+        x, y = pos
+        rows, cols = self.grid.shape
+        if 0 <= y < rows and 0 <= x < cols and self.grid[y, x]:
+            return int(self.grid[y, x])
+        raise KeyError(pos)
+
+
+    def __iter__(self):
+        ys, xs = np.nonzero(self.grid)
+        return zip(xs.tolist(), ys.tolist())
+
+
+    def __len__(self):
+        return int(np.count_nonzero(self.grid))
@@ -2,8 +2,12 @@
 from random import randint, random
 from math import sin    # cos is included with sprite_object import
 
+# pip install
+import numpy as np
+
 # local
 from sprite_object import *
+from raycasting import dda_steps
 
 class NPC(AnimatedSprite):
     def __init__(self, game, path='resources/sprites/npc/soldier/0.png', 
@@ -29,27 +33,45 @@ class NPC(AnimatedSprite):
         # We need to cast a single ray so we have a line of sight (npc logic; impenetrable walls)
         # will be just a general copy/paste of the raycasting method with some changes
         self.LOS = False
+        self.batch_LOS = None   # this frame's LOS from ObjectHandler.check_LOS(), None to cast our own ray
         self.npc_search_trigger = False
 
         
     def update(self):
-        self.check_animation_time()
+        # every frame: just the projection, at the position ObjectHandler interpolated for the frame
         self.get_sprite()
-        self.run_logic()
         # self.debug_draw_ray_cast()
 
+
+    def tick(self):
+        # every simulation tick (see Game.simulate) we're scheduled for: animation, ai, movement and combat
+        self.check_animation_time(self.game.sim_time)
+        self.run_logic()
+
+
+    def get_ai_tier(self):
+        # our tier of AI_TIER_INTERVALS for ObjectHandler.schedule_npcs: 'active' while anything is going on,
+        # 'idle' / 'dormant' (by distance) while we stand around waiting to see the player, 'dead' once we're done dying
+        if not self.alive:
+            return 'active' if self.frame_counter < len(self.death_images) - 1 else 'dead'
+        if self.pain or self.LOS or (self.npc_search_trigger and self.dist < self.search_dist):
+            return 'active'
+        return 'idle' if self.dist < AI_DORMANT_DIST else 'dormant'
+
     
     def check_wall(self, x, y):
         # check_wall, check_wall_collision copied from player.py with some changes
-        return (x, y) not in self.game.map.world_map
+        return not self.game.map.tile_rows[y][x]
 
 
     def check_wall_collision(self, dx, dy):
         # disallow movement (dx, dy) if such movement puts npc in wall (accounting for npc's size)
-        # 'size' instead of 'scale=size/delta_time' since npc doesn't depend on delta_time
-        if self.check_wall(int(self.x + dx * self.size), int(self.y)):
+        # 'size' instead of 'scale=size/delta_time' since npc doesn't depend on delta_time - but dx, dy are a whole
+        # tick's worth of SIM_FRAMES frames of movement, so the size is divided by that to look ahead the same distance
+        scale = self.size / SIM_FRAMES
+        if self.check_wall(int(self.x + dx * scale), int(self.y)):
             self.x += dx
-        if self.check_wall(int(self.x), int(self.y + dy * self.size)):
+        if self.check_wall(int(self.x), int(self.y + dy * scale)):
             self.y += dy
 
 
@@ -67,9 +89,9 @@ class NPC(AnimatedSprite):
             # calculate the angle if NPC looks at center of this tile
             angle = atan2(next_y + 0.5 - self.y, next_x + 0.5 - self.x)
 
-            # knowing the angle, calc increments for x, y-axis
-            dx = cos(angle) * self.speed
-            dy = sin(angle) * self.speed
+            # knowing the angle, calc increments for x, y-axis (speed is per frame at FPS, this is a whole tick)
+            dx = cos(angle) * self.speed * SIM_FRAMES
+            dy = sin(angle) * self.speed * SIM_FRAMES
             self.check_wall_collision(dx, dy)
 
 
@@ -85,7 +107,7 @@ class NPC(AnimatedSprite):
     def animate_death(self):
         if not self.alive:
             # increases the frame_counter, changes the frame, for every global timer trigger until anim complete
-            if self.game.global_trigger and self.frame_counter < len(self.death_images) - 1:
+            if self.game.sim_trigger and self.frame_counter < len(self.death_images) - 1:
                 self.death_images.rotate(-1)
                 self.image = self.death_images[0]
                 self.frame_counter += 1
@@ -101,7 +123,7 @@ class NPC(AnimatedSprite):
     def check_target_hit(self):
         if self.LOS and self.game.player.fired:
             # we know the edges of our sprite projection from other calculations
-            if HALF_WIDTH - self.sprite_half_width < self.screen_x < HALF_WIDTH + self.sprite_half_width:
+            if VIEW_HALF_WIDTH - self.sprite_half_width < self.screen_x < VIEW_HALF_WIDTH + self.sprite_half_width:
                 self.game.sound.npc_pain.play()
                 self.game.player.fired = False
                 self.pain = True
@@ -117,7 +139,7 @@ class NPC(AnimatedSprite):
 
     def run_logic(self):
         if self.alive:
-            self.LOS = self.player_has_LOS()
+            self.LOS = self.player_has_LOS() if self.batch_LOS is None else self.batch_LOS
             self.check_target_hit()
 
             if self.pain:
@@ -161,6 +183,8 @@ class NPC(AnimatedSprite):
 
         px, py = self.game.player.pos
         map_x, map_y = self.game.player.map_pos
+        tile_rows = self.game.map.tile_rows
+        rows, cols = self.game.map.grid.shape
 
         # the ray angle is known to us from the Sprite class update method
         ray_angle = self.theta
@@ -186,7 +210,8 @@ class NPC(AnimatedSprite):
             if tile_vert == self.map_pos:    # npc
                 player_dist_v = depth_vert
                 break
-            if tile_vert in self.game.map.world_map:  # wall
+            tile_x, tile_y = tile_vert
+            if 0 <= tile_y < rows and 0 <= tile_x < cols and tile_rows[tile_y][tile_x]:  # wall
                 wall_dist_v = depth_vert
                 break
 
@@ -211,7 +236,8 @@ class NPC(AnimatedSprite):
             if tile_hor == self.map_pos:
                 player_dist_h = depth_hor
                 break
-            if tile_hor in self.game.map.world_map:  
+            tile_x, tile_y = tile_hor
+            if 0 <= tile_y < rows and 0 <= tile_x < cols and tile_rows[tile_y][tile_x]:  # wall
                 wall_dist_h = depth_hor
                 break
 
@@ -241,6 +267,102 @@ class NPC(AnimatedSprite):
             pg.draw.line(self.game.screen, 'orange', (TILEPX * self.game.player.x, TILEPX * self.game.player.y),
                         (TILEPX * self.x, TILEPX * self.y), 2)
 
+# NPC.player_has_LOS() for many npcs at once (LOS_BACKEND = 'numpy', see ObjectHandler.check_LOS): the same
+# two DDAs, but every npc's ray is a row and every grid intersection a column, like RayCasting.cast_rays().
+# thetas are the npcs' angles as seen from the player, npc_tiles their map_pos as an (n, 2) int array and grid the
+# map's dense grid. Returns one bool per npc, matching what player_has_LOS() would return for each
+def batch_player_has_LOS(player_pos, player_map_pos, thetas, npc_tiles, grid):
+    px, py = player_pos
+    map_x, map_y = player_map_pos
+    rows, cols = grid.shape
+    n = len(thetas)
+    if not n:
+        return np.zeros(0, bool)    # (no npc ticking: np.array([]) of no tiles isn't even (0, 2))
+
+    cos_a = np.cos(thetas)
+    sin_a = np.sin(thetas)
+
+    # a ray straight along an axis never crosses the other axis' lines: the divisions give inf / nan, which the
+    # lookups below treat as open space (player_has_LOS() itself raises ZeroDivisionError there)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # the VERTICALS go in rows [:n], the HORIZONTALS in rows [n:], so both DDAs run as one
+        start, step = np.empty((2, 3, 2 * n))   # (x, y, depth) of the first intersection, and per step
+        x_vert = np.where(cos_a > 0, map_x + 1, map_x - 1e-6)
+        step[0, :n] = np.where(cos_a > 0, 1.0, -1.0)
+        start[2, :n] = (x_vert - px) / cos_a
+        start[0, :n] = x_vert
+        start[1, :n] = (start[2, :n] * sin_a) + py
+        step[2, :n] = step[0, :n] / cos_a
+        step[1, :n] = step[2, :n] * sin_a
+
+        y_hor = np.where(sin_a > 0, map_y + 1, map_y - 1e-6)
+        step[1, n:] = np.where(sin_a > 0, 1.0, -1.0)
+        start[2, n:] = (y_hor - py) / sin_a
+        start[0, n:] = (start[2, n:] * cos_a) + px
+        start[1, n:] = y_hor
+        step[2, n:] = step[1, n:] / sin_a
+        step[0, n:] = step[2, n:] * cos_a
+
+        # MAX_DEPTH intersections per ray, like 'for i in range(MAX_DEPTH)'
+        xs, ys, depths = dda_steps(start.reshape(-1), step.reshape(-1), MAX_DEPTH - 1).reshape(3, 2 * n, MAX_DEPTH)
+
+        # walk each ray to its first npc tile or wall
+        tile_x = xs.clip(-1, cols).astype(np.intp)  # int() truncates toward zero, and so does astype
+        tile_y = ys.clip(-1, rows).astype(np.intp)
+        inside = (tile_x >= 0) & (tile_x < cols) & (tile_y >= 0) & (tile_y < rows)
+        wall = inside & (grid[tile_y.clip(0, rows - 1), tile_x.clip(0, cols - 1)] != 0)
+        npc_tiles = np.concatenate((npc_tiles, npc_tiles))
+        npc = (tile_x == npc_tiles[:, :1]) & (tile_y == npc_tiles[:, 1:])  # checked first: wins over a wall
+
+        ray = np.arange(2 * n)
+        first = (npc | wall).argmax(axis=1)
+        hit_npc = npc[ray, first]
+        event_depth = depths[ray, first]
+        player_dist = np.where(hit_npc, event_depth, 0.0)
+        wall_dist = np.where(wall[ray, first] & ~hit_npc, event_depth, 0.0)
+
+        # max() of the vertical and horizontal result as python does it (the first argument unless the second
+        # is bigger), then the same LOS test
+        player_dist = np.where(player_dist[n:] > player_dist[:n], player_dist[n:], player_dist[:n])
+        wall_dist = np.where(wall_dist[n:] > wall_dist[:n], wall_dist[n:], wall_dist[:n])
+        has_LOS = ((0 < player_dist) & (player_dist < wall_dist)) | (wall_dist == 0)
+
+    # player in the same tile as the npc - automatic LOS
+    return has_LOS | ((npc_tiles[:n, 0] == map_x) & (npc_tiles[:n, 1] == map_y))
+
+
+class LOSCache:
+    # Line of sight per (player tile, npc tile) pair, so npcs only look again when one of them changes tiles.
+    # A pair's LOS is cast from the middle of the player's tile to the middle of the npc's (batch_player_has_LOS, all
+    # new pairs of a frame at once), which makes it the same however either of them stands inside their tile.
+    # Everything is dropped when game_map.version changes
+    def __init__(self, game_map):
+        self.map = game_map
+        self.version = game_map.version
+        self.pairs = {}     # (player tile, npc tile) -> LOS
+        self.hits = 0
+        self.misses = 0
+
+
+    def get_LOS(self, player_tile, npc_tiles):
+        # LOS of every tile in npc_tiles from player_tile, as a list of bools
+        if self.map.version != self.version:
+            self.pairs.clear()
+            self.version = self.map.version
+
+        new_tiles = list({tile for tile in npc_tiles if (player_tile, tile) not in self.pairs})
+        self.misses += len(new_tiles)
+        self.hits += len(npc_tiles) - len(new_tiles)
+        if new_tiles:
+            px, py = player_tile[0] + 0.5, player_tile[1] + 0.5
+            tiles = np.array(new_tiles)
+            thetas = np.arctan2(tiles[:, 1] + 0.5 - py, tiles[:, 0] + 0.5 - px)
+            has_LOS = batch_player_has_LOS((px, py), player_tile, thetas, tiles, self.map.grid)
+            for tile, LOS in zip(new_tiles, has_LOS.tolist()):
+                self.pairs[player_tile, tile] = LOS
+        return [self.pairs[player_tile, tile] for tile in npc_tiles]
+
+
 #
 # ENEMY CLASSES
 #
@@ -1,6 +1,10 @@
+# pip install
+import numpy as np
+
 # local
 from sprite_object import *
 from npc import *
+from spatial_grid import *
 
 
 class ObjectHandler:
@@ -9,6 +13,19 @@ class ObjectHandler:
         self.sprite_list = []
         self.npc_list = []
         self.npc_locations = {}
+        # which tile every sprite / npc is in, for the culling in update()
+        self.sprite_grid = SpatialGrid()
+        self.npc_grid = SpatialGrid()
+        # struct-of-arrays storage for project_sprites(): every sprite and npc has a row (obj.row)
+        self.objects = []       # the objects, in row order
+        self.positions = None   # their (x, y) as a numpy array; rebuilt on first use after an add
+        self.previous_positions = None  # and as they were before the last simulation tick
+        self.projection = {}    # row -> (dx, dy, theta, screen_x, dist, norm_dist) of the objects updated this frame
+        self.los_cache = LOSCache(game.map)
+        # AI level of detail (see schedule_npcs): ticks scheduled, npcs per tier on the last one, npc ticks run per tier
+        self.ai_ticks = 0
+        self.ai_tier_counts = dict.fromkeys(AI_TIER_INTERVALS, 0)
+        self.ai_updates = dict.fromkeys(AI_TIER_INTERVALS, 0)
         self.npc_path = 'resources/sprites/npc/'
         self.static_path = 'resources/sprites/static_sprites/'
         self.animated_path = 'resources/sprites/animated_sprites/'
@@ -54,26 +71,155 @@ class ObjectHandler:
 
 
     def update(self):
+        # every frame: project what's in view. Npcs are drawn where they'd be sim_alpha of the way from their
+        # position before the last simulation tick to their position now (everything else they do is in tick())
+        if FOV_CULLING:
+            # sprites in tiles the rays don't reach can't be seen: skip them altogether (they don't do anything else).
+            # npcs out of sight just aren't projected
+            visible_tiles, origin = self.game.ray_casting.get_visible_tiles()
+            sprites = self.sprite_grid.query(visible_tiles, origin)
+            in_view = set(self.npc_grid.query(visible_tiles, origin))
+            for npc in self.npc_list:
+                npc.in_view = npc in in_view
+        else:
+            sprites = self.sprite_list
+
+        # call the update method for all objects in our lists (after working out all their projections at once)
+        objects = sprites + self.npc_list
+        self.project_sprites(objects, self.game.sim_alpha)
+        for obj in objects:
+            obj.read_projection(self.projection)
+        [sprite.update() for sprite in sprites]
+        [npc.update() for npc in self.npc_list]
+
+
+    def tick(self):
+        # one fixed-rate simulation step (see Game.simulate): npc ai, pathfinding and combat
         # build a dict of current positions so we ensure npcs do not marge/overlap one another while pathfinding.
         self.npc_locations = {npc.map_pos for npc in self.npc_list if npc.alive}
         self.check_victory()
+        if self.game.restart:
+            return
 
-        # call the update method for all objects in our lists
-        [sprite.update() for sprite in self.sprite_list]
-        [npc.update() for npc in self.npc_list]
+        self.project_sprites(self.npc_list)
+        self.previous_positions[:] = self.positions
+        for npc in self.npc_list:
+            npc.read_projection(self.projection)    # from where they really are, rather than where they're drawn
+
+        npcs = self.schedule_npcs() if AI_LOD else self.npc_list
+        if LOS_CACHE or LOS_BACKEND == 'numpy':
+            self.check_LOS(npcs)
+        for npc in npcs:
+            if self.game.restart:
+                break   # an npc before this one ended the game (see Player.check_game_over)
+            self.game.map.load_around(npc.x, npc.y, NPC_LOAD_RADIUS)   # (chunk maps) the walls it can bump into
+            npc.tick()
+            self.npc_grid.move(npc)
+            self.positions[npc.row] = npc.x, npc.y
+
+        # the shot (if any) has had its chance to hit every npc
+        self.game.player.fired = False
+
+
+    def project_sprites(self, objects, alpha=1):
+        # Where the given sprites and npcs are relative to the player, all in one go: the angle and distance math of
+        # Sprite.get_sprite() (each object just reads its row of the result, see read_projection) as numpy columns.
+        # alpha < 1 projects them that far between their previous_positions and positions (see update())
+        if self.positions is None:
+            self.positions = np.array([(obj.x, obj.y) for obj in self.objects], dtype=float).reshape(-1, 2)
+            self.previous_positions = self.positions.copy()
+        rows = [obj.row for obj in objects]
+        positions = self.positions[rows]
+        if alpha != 1:
+            previous = self.previous_positions[rows]
+            positions = previous + (positions - previous) * alpha
+        player_angle = self.game.player.angle
+
+        # angle between player and sprite is theta = arctan[(sy - py)/(sx - px))
+        # see 'player-sprite-delta_angle.jpg' and 'player-sprite-theta.jpg'
+        dx = positions[:, 0] - self.game.player.x
+        dy = positions[:, 1] - self.game.player.y
+        theta = np.arctan2(dy, dx)  # atan2 ensures result is in correct quadrant [-pi, pi] over atan
+
+        delta = theta - player_angle
+
+        # due to signage in polar trig, if dx > 0 and player angle is > pi -OR- dx, dy both < 0, we have to add 2pi (tau)
+        delta[((dx > 0) & (player_angle > pi)) | ((dx < 0) & (dy < 0))] += 2 * pi
+
+        # how many rays fit in that delta angle is how many rays from the edge of our FOV;
+        # add delta_rays to the central ray and multiply by scale to get the x-pos of sprite on screen
+        screen_x = (HALF_NUM_RAYS + delta / DELTA_ANGLE) * SCALE
+
+        # To calc size of projection for sprite, first calc distance; normalize to remove fish-lens effect
+        dist = np.hypot(dx, dy)
+        norm_dist = dist * np.cos(delta)
+
+        # back to python floats: reading those per object is much cheaper than indexing numpy arrays
+        self.projection = dict(zip(rows, zip(dx.tolist(), dy.tolist(), theta.tolist(), screen_x.tolist(),
+                                             dist.tolist(), norm_dist.tolist())))
+
+
+    def schedule_npcs(self):
+        # AI level of detail: the npcs whose turn it is this tick. Each npc is in a tier of AI_TIER_INTERVALS
+        # (NPC.get_ai_tier) and gets every Nth tick of it, offset by its place in npc_list so a tier's npcs take
+        # turns rather than all going on the same tick. When the player fires, every living npc goes (for the hit)
+        self.ai_ticks += 1
+        fired = self.game.player.fired
+        self.ai_tier_counts = dict.fromkeys(AI_TIER_INTERVALS, 0)
+        npcs = []
+        for index, npc in enumerate(self.npc_list):
+            tier = npc.get_ai_tier()
+            self.ai_tier_counts[tier] += 1
+            interval = AI_TIER_INTERVALS[tier]
+            if (interval and (self.ai_ticks + index) % interval == 0) or (fired and npc.alive):
+                npcs.append(npc)
+                self.ai_updates[tier] += 1
+        return npcs
+
+
+    def check_LOS(self, npcs):
+        # every living npc's line of sight to the player in one go (or from LOS_CACHE), for NPC.run_logic() to pick up.
+        # Nothing in this frame's update can change them: the player has already moved, and an npc's ray only
+        # looks for walls and its own tile, which it only leaves in its own movement() - after it looked
+        npcs = [npc for npc in npcs if npc.alive]
+        if LOS_CACHE:
+            has_LOS = self.los_cache.get_LOS(self.game.player.map_pos, [npc.map_pos for npc in npcs])
+            for npc, LOS in zip(npcs, has_LOS):
+                npc.batch_LOS = LOS
+            return
+        if len(npcs) < LOS_BATCH_MIN:
+            for npc in npcs:
+                npc.batch_LOS = None
+            return
+        thetas = np.array([self.projection[npc.row][2] for npc in npcs])
+        npc_tiles = np.array([npc.map_pos for npc in npcs])
+        has_LOS = batch_player_has_LOS(self.game.player.pos, self.game.player.map_pos, thetas, npc_tiles,
+                                       self.game.map.grid)
+        for npc, LOS in zip(npcs, has_LOS.tolist()):
+            npc.batch_LOS = LOS
 
 
     def check_victory(self):
-        if not len(self.npc_locations):
+        if not len(self.npc_locations) and not self.game.restart:
             self.game.object_renderer.victory()
             pg.display.flip()
             pg.time.delay(1500)
-            self.game.new_game()
+            self.game.restart = True    # Game.run_frame() starts the next game once this frame is done
 
 
     def add_npc(self, npc):
         self.npc_list.append(npc)
+        self.npc_grid.insert(npc)
+        self.add_object(npc)
 
 
     def add_sprite(self, sprite):
-        self.sprite_list.append(sprite)
\ No newline at end of file
+        self.sprite_list.append(sprite)
+        self.sprite_grid.insert(sprite)
+        self.add_object(sprite)
+
+
+    def add_object(self, obj):
+        obj.row = len(self.objects)
+        self.objects.append(obj)
+        self.positions = None
\ No newline at end of file
@@ -1,15 +1,18 @@
 # pip installl
+import numpy as np
 import pygame as pg
 
 # local
 from settings import *
+from asset_cache import *
 
 class ObjectRenderer:
     def __init__(self, game):
         self.game = game
         self.screen = game.screen
+        self.view = game.view   # the 3-D view is drawn here, the HUD on screen (the same Surface at RENDER_SCALE = 1)
         self.wall_textures_dict = self.load_wall_textures()
-        self.sky_image = self.get_texture('resources/textures/sky.png', (WIDTH, HALF_HEIGHT))
+        self.sky_image = self.get_texture('resources/textures/sky.png', (VIEW_WIDTH, VIEW_HALF_HEIGHT))
         self.sky_offset = 0
         self.blood_screen = self.get_texture('resources/textures/blood_screen.png', RES)
         self.digit_images = [self.get_texture(f'resources/textures/digits/{i}.png', DIGIT_RES) for i in range(11)]
@@ -27,9 +30,17 @@ class ObjectRenderer:
     def draw(self):
         self.draw_background()
         self.render_game_objects()
+        self.present_view()
         self.draw_player_health()
 
 
+    def present_view(self):
+        # scale the view up to the window in one pass
+        if self.view is not self.screen:
+            scale = pg.transform.smoothscale if RENDER_SMOOTH else pg.transform.scale
+            scale(self.view, RES, self.screen)
+
+
     def victory(self):
         self.screen.blit(self.victory_image, (0, 0))
 
@@ -54,12 +65,12 @@ class ObjectRenderer:
         # this is just a clever function for determining pos of sky based on rel mouse movement
         # it provides an illusion of background depth relative to the foreground
         # ...don't ask me. You can kind of see what's happening by commenting out individal blits
-        self.sky_offset = (self.sky_offset + 4.0 * self.game.player.rel_x) % WIDTH
-        self.screen.blit(self.sky_image, (-self.sky_offset, 0))
-        self.screen.blit(self.sky_image, (-self.sky_offset + WIDTH, 0))
+        self.sky_offset = (self.sky_offset + 4.0 * RENDER_SCALE * self.game.player.rel_x) % VIEW_WIDTH
+        self.view.blit(self.sky_image, (-self.sky_offset, 0))
+        self.view.blit(self.sky_image, (-self.sky_offset + VIEW_WIDTH, 0))
 
         # floor - just fill bottom half of screen with solid color
-        pg.draw.rect(self.screen, FLOOR_COLOR, (0, HALF_HEIGHT, WIDTH, HEIGHT))
+        pg.draw.rect(self.view, FLOOR_COLOR, (0, VIEW_HALF_HEIGHT, VIEW_WIDTH, VIEW_HEIGHT))
 
 
     def render_game_objects(self):
@@ -67,15 +78,46 @@ class ObjectRenderer:
         # objs must be sorted by dist so closer walls are drawn after further entities, else see-thru walls
         # distance is the first value in the tuple
         list_objects = sorted(self.game.ray_casting.objects_to_render, key=lambda dist: dist[0], reverse=True)
+
+        # with the 'buffer' wall renderer the walls are already one layer and the list only holds sprites,
+        # so instead of sorting sprites in between wall slices we cut them where a closer wall covers them
+        if WALL_RENDERER == 'buffer':
+            self.view.blit(self.game.ray_casting.wall_layer, (0, 0))
+            wall_depths = self.game.ray_casting.get_ray_arrays()[0]
+            for dist, image, pos in list_objects:
+                self.blit_occluded(image, pos, dist, wall_depths)
+            return
+
         for _dist, image, pos in list_objects:
-            self.screen.blit(image, pos)
+            self.view.blit(image, pos)
+
+
+    def blit_occluded(self, image, pos, dist, wall_depths):
+        # blit only the parts of a sprite that lie in rays whose wall is further away than the sprite
+        x, y = int(pos[0]), pos[1]
+        width = image.get_width()
+        first_ray = max(x // SCALE, 0)
+        last_ray = min((x + width - 1) // SCALE + 1, NUM_RAYS)
+        if first_ray >= last_ray:
+            return
+
+        visible = wall_depths[first_ray:last_ray] > dist
+        if visible.all():
+            self.view.blit(image, (x, y))
+            return
+
+        # each run of visible rays becomes one blit of that vertical strip of the image
+        edges = np.flatnonzero(np.diff(np.concatenate(([False], visible, [False]))))
+        for start, stop in edges.reshape(-1, 2):
+            left = max((first_ray + start) * SCALE, x)
+            right = min((first_ray + stop) * SCALE, x + width)
+            self.view.blit(image, (left, y), (left - x, 0, right - left, image.get_height()))
 
 
     @staticmethod
     def get_texture(path, res=(TEXTURE_SIZE, TEXTURE_SIZE)):
-        texture = pg.image.load(path).convert_alpha()
-        # scale and return the image
-        return pg.transform.scale(texture, res)
+        # load, scale and return the image (decoded and scaled once per process, see asset_cache.py)
+        return load_scaled_image(path, res)
 
     def load_wall_textures(self):
         # return a Dict in which the texture no. is key and texture itself is value
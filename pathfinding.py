@@ -1,18 +1,52 @@
 # std lib
 from collections import deque
+from heapq import heappop, heappush
+from math import inf, sqrt
+
+# local
+from settings import *
+
+DIAGONAL_COST = sqrt(2)     # astar(): a diagonal step, against 1 for a straight one
 
 class PathFinding:
     def __init__(self, game) -> None:
         self.game = game
-        self.map = game.map.mini_map
         self.routes = [-1, -1], [-1, 0], [-1, 1], [0, -1], [0, 1], [1, -1], [1, 0], [1, 1]  # start=[0, 0]
-        self.moves_dict = {}
-        self.get_moves_dict()
+        # map coord -> list of available moves, worked out the first time a search gets to the tile
+        self.moves_dict = MovesDict(self)
+
+        # shared flow field (PATHFINDING = 'flow_field'): the next step towards flow_goal from every reachable tile
+        self.flow_field = {}
+        self.flow_goal = None
+        self.flow_blocked = frozenset()     # npc_locations the field was built around
+        self.flow_version = None            # and the map.version
+        self.flow_field_builds = 0
+
+        # hierarchical pathfinding (PATHFINDING = 'hpa'): cluster -> its graph of entrances (see get_hpa_step)
+        self.clusters = ClusterDict(self)
+        self.goal_edges = {}            # the ways into the last goal from the entrances of its cluster
+        self.goal_edges_key = None      # and (goal, map.version) they're for
+        if PATHFINDING == 'hpa' and not self.game.map.chunk_map:
+            # the whole map, up front (a chunk map's clusters are worked out as searches get to them)
+            self.build_clusters()
 
 
     def get_path(self, start, goal):
+        if PATHFINDING == 'flow_field':
+            return self.get_flow_step(start, goal)
+        if PATHFINDING == 'hpa':
+            return self.get_hpa_step(start, goal)
+
+        if PATHFINDING == 'astar':
+            # when the goal can't be reached (or the search ran out of PATH_MAX_EXPANSIONS), head for the tile it
+            # got to that's closest to it - or, from there already, straight for the goal as with bfs
+            self.visited_dict, closest = self.astar(start, goal)
+            if closest != start:
+                goal = closest
+        else:
+            self.visited_dict = self.bfs(start, goal, self.moves_dict)
+
         # restore bfs path from initial to desired tile (from npc to player); only need to generate the next step
-        self.visited_dict = self.bfs(start, goal, self.moves_dict)
         path = [goal]
 
         # try to retrieve goal from dict; if it doesn't exist return start which ends the algo
@@ -46,23 +80,328 @@ class PathFinding:
             next_nodes = moves_dict[cur_node]
             for next_node in next_nodes:
                 # if we haven't visited the tile yet, and it is not currently occupied, add it to the queue
-                if next_node not in visited_dict and next_node not in self.game.object_handler.npc_locations:
+                # (nor if it's further from the goal than searches go, see in_search_area())
+                if next_node not in visited_dict and next_node not in self.game.object_handler.npc_locations \
+                        and self.in_search_area(next_node, goal):
                     queue.append(next_node)
                     # then add it as a key to visited dict with value=first item in queue (current node)
                     visited_dict[next_node] = cur_node
         return visited_dict
 
 
+    def astar(self, start, goal):
+        # A*: like bfs() it grows a came-from dict out from start, but it expands the open tile with the lowest cost
+        # so far plus octile distance to the goal first, so it heads for the goal rather than flooding every tile
+        # around the npc. Straight steps cost 1 and diagonal ones DIAGONAL_COST, so octile distance is what the way
+        # to the goal would cost with nothing in it and the path found is the shortest. Occupied tiles and the
+        # search area are as in bfs(). Gives up after PATH_MAX_EXPANSIONS tiles; returns (came-from dict, the tile
+        # reached closest to the goal)
+        npc_locations = self.game.object_handler.npc_locations     # (looked up once, not per neighbour)
+        moves_dict = self.moves_dict
+        goal_x, goal_y = goal
+        visited_dict = {start: None}
+        costs = {start: 0}
+        heuristic = octile_distance(start, goal)
+        # the open tiles, as (cost + heuristic, heuristic, cost, tile): ties go to the one nearer the goal
+        open_heap = [(heuristic, heuristic, 0, start)]
+        closest, closest_heuristic = start, heuristic
+        expansions = 0
+
+        while open_heap:
+            _estimate, heuristic, cost, cur_node = heappop(open_heap)
+            # a tile is pushed again whenever a cheaper way to it turns up; the dearer entries left behind are skipped
+            if cost > costs[cur_node]:
+                continue
+            if heuristic < closest_heuristic:
+                closest, closest_heuristic = cur_node, heuristic
+            if cur_node == goal or expansions == PATH_MAX_EXPANSIONS:
+                break
+            expansions += 1
+
+            cur_x, cur_y = cur_node
+            for next_node in moves_dict[cur_node]:
+                next_x, next_y = next_node
+                next_cost = cost + (DIAGONAL_COST if next_x != cur_x and next_y != cur_y else 1)
+                if next_cost >= costs.get(next_node, next_cost + 1) or next_node in npc_locations:
+                    continue
+                dx, dy = abs(next_x - goal_x), abs(next_y - goal_y)
+                if dx > PATH_SEARCH_RADIUS or dy > PATH_SEARCH_RADIUS:  # (in_search_area(), inlined)
+                    continue
+                next_heuristic = dx + dy + (DIAGONAL_COST - 2) * min(dx, dy)   # (octile_distance(), inlined)
+                costs[next_node] = next_cost
+                visited_dict[next_node] = cur_node
+                heappush(open_heap, (next_cost + next_heuristic, next_heuristic, next_cost, next_node))
+        return visited_dict, closest
+
+
     def get_next_nodes(self, x, y):
         # builds a list of valid moves relative to current tile as (0,0)
-        return [(x + rx, y + ry) for rx, ry in self.routes if (x + rx, y + ry) not in self.game.map.world_map]
+        return [(x + rx, y + ry) for rx, ry in self.routes if not self.game.map.get_tile(x + rx, y + ry)]
 
     
-    def get_moves_dict(self):
-        # build a Dict with key=map coord and value=list of available moves
-        for y, row in enumerate(self.map):
-            for x, col in enumerate(row):
-                # if tile is not an obstacle...
-                if not col:
-                    # build a list of possible moves by merging with growing list
-                    self.moves_dict[(x, y)] = self.moves_dict.get((x, y), []) + self.get_next_nodes(x, y)
\ No newline at end of file
+    def update_tile(self, x, y):
+        # Map.set_tile() changed (x, y): forget the moves of it and the 8 tiles around it, the only ones that can
+        # step onto it, and moves_dict works them out again next time a search gets there
+        for rx, ry in ((0, 0),) + self.routes:
+            self.moves_dict.pop((x + rx, y + ry), None)
+        # and the clusters with a border the tile is on
+        for rx, ry in (0, 0), (-1, 0), (1, 0), (0, -1), (0, 1):
+            self.clusters.pop(self.get_cluster((x + rx, y + ry)), None)
+
+
+    def update_area(self, left, top, width, height):
+        # update_tile() for every tile of an area at once (Map.load_around() copying in a chunk)
+        for y in range(top - 1, top + height + 1):
+            for x in range(left - 1, left + width + 1):
+                self.moves_dict.pop((x, y), None)
+        size = PATH_CLUSTER_SIZE
+        for cluster_y in range((top - 1) // size, (top + height) // size + 1):
+            for cluster_x in range((left - 1) // size, (left + width) // size + 1):
+                self.clusters.pop((cluster_x, cluster_y), None)
+
+
+    @staticmethod
+    def in_search_area(node, goal):
+        # searches stay within PATH_SEARCH_RADIUS tiles of the goal (the player), which is all of the shipped map;
+        # on a big chunk map that keeps them to the chunks loaded around the player, and their cost bounded
+        return abs(node[0] - goal[0]) <= PATH_SEARCH_RADIUS and abs(node[1] - goal[1]) <= PATH_SEARCH_RADIUS
+
+
+    def get_flow_step(self, start, goal):
+        # every npc chases the same goal (the player's tile), so instead of a bfs per npc per frame we keep one
+        # field of next steps towards the goal, rebuilt only when the goal or the occupied tiles change
+        npc_locations = self.game.object_handler.npc_locations
+        if goal != self.flow_goal or npc_locations != self.flow_blocked or self.game.map.version != self.flow_version:
+            self.build_flow_field(goal, npc_locations)
+
+        # like get_path() with bfs, an npc that can't reach the goal heads straight for it
+        return self.flow_field.get(start, goal)
+
+
+    def build_flow_field(self, goal, npc_locations):
+        # a single bfs outward from the goal; each tile it reaches points back at the tile it was reached from,
+        # which is one step closer to the goal. Tiles occupied by npcs get a next step (that npc needs one)
+        # but are not expanded, so no path runs through another npc - the same rule bfs() applies
+        self.flow_goal = goal
+        self.flow_blocked = frozenset(npc_locations)
+        self.flow_version = self.game.map.version
+        self.flow_field_builds += 1
+
+        flow_field = {goal: goal}
+        queue = deque([goal])
+        while queue:
+            cur_node = queue.popleft()
+            if cur_node in npc_locations and cur_node != goal:
+                continue
+            for next_node in self.moves_dict[cur_node]:
+                if next_node not in flow_field and self.in_search_area(next_node, goal):
+                    flow_field[next_node] = cur_node
+                    queue.append(next_node)
+        self.flow_field = flow_field
+
+
+    def get_hpa_step(self, start, goal):
+        # hierarchical pathfinding, after HPA*: the map is cut into clusters PATH_CLUSTER_SIZE tiles a side, and
+        # the ways across the borders between them (entrances) and from entrance to entrance within each are worked
+        # out ahead of time (build_cluster). A search only goes tile by tile in the npc's own cluster and the goal's;
+        # in between it hops from entrance to entrance, a few per cluster however many tiles they have, and only
+        # the stretch out of the npc's cluster is turned back into tiles for the next step. Paths come out close to
+        # the shortest rather than the shortest. Occupied tiles are only avoided in the npc's own cluster (the npcs
+        # further on will have moved by the time it gets there)
+        if start == goal:
+            return goal
+        came_from, costs = self.search_cluster(start, self.game.object_handler.npc_locations)
+        if goal in came_from:
+            return self.first_step(came_from, start, goal)
+
+        # the start's ways out: to the entrances of its cluster it can get to, and across the border if it's on one
+        start_cluster = self.get_cluster(start)
+        entrances = self.clusters[start_cluster]
+        start_edges = {node: costs[node] for node in entrances if node in costs and node != start}
+        for node, cost in entrances.get(start, {}).items():
+            if self.get_cluster(node) != start_cluster:
+                start_edges[node] = cost
+        goal_edges = self.get_goal_edges(goal)
+
+        # A* from entrance to entrance (astar() with the entrances for tiles)
+        parents = {start: None}
+        costs = {start: 0}
+        open_heap = [(octile_distance(start, goal), 0, start)]
+        while open_heap:
+            _estimate, cost, node = heappop(open_heap)
+            if cost > costs[node]:
+                continue
+            if node == goal:
+                break
+            if node == start:
+                edges = start_edges
+            else:
+                edges = self.clusters[self.get_cluster(node)][node]
+                if node in goal_edges:
+                    edges = {**edges, goal: goal_edges[node]}
+            for next_node, edge_cost in edges.items():
+                next_cost = cost + edge_cost
+                if next_cost >= costs.get(next_node, inf) or not self.in_search_area(next_node, goal):
+                    continue
+                costs[next_node] = next_cost
+                parents[next_node] = node
+                heappush(open_heap, (next_cost + octile_distance(next_node, goal), next_cost, next_node))
+
+        # no chain of entrances gets from the npc to the goal's cluster inside the search area (walls between them,
+        # or other npcs boxing it in within its own cluster): the goal itself comes back as the step, and
+        # NPC.movement() walks straight at it into whatever's in the way until a way opens up, as with bfs()
+        if goal not in parents:
+            return goal
+        # the first entrance on the way: either in the start's cluster, or just across the border from it
+        node = goal
+        while parents[node] != start:
+            node = parents[node]
+        return self.first_step(came_from, start, node) if node in came_from else node
+
+
+    def search_cluster(self, start, blocked=()):
+        # Dijkstra from start to every tile of its cluster it can get to without leaving the cluster or going
+        # through a blocked tile: (came-from dict, costs), step costs as in astar()
+        cluster = self.get_cluster(start)
+        size = PATH_CLUSTER_SIZE
+        moves_dict = self.moves_dict
+        came_from = {start: None}
+        costs = {start: 0}
+        open_heap = [(0, start)]
+        while open_heap:
+            cost, cur_node = heappop(open_heap)
+            if cost > costs[cur_node]:
+                continue
+            cur_x, cur_y = cur_node
+            for next_node in moves_dict[cur_node]:
+                next_x, next_y = next_node
+                next_cost = cost + (DIAGONAL_COST if next_x != cur_x and next_y != cur_y else 1)
+                if next_cost >= costs.get(next_node, inf) or (next_x // size, next_y // size) != cluster \
+                        or next_node in blocked:
+                    continue
+                costs[next_node] = next_cost
+                came_from[next_node] = cur_node
+                heappush(open_heap, (next_cost, next_node))
+        return came_from, costs
+
+
+    @staticmethod
+    def first_step(came_from, start, node):
+        # the step out of start on the way to node
+        while came_from[node] != start:
+            node = came_from[node]
+        return node
+
+
+    def get_goal_edges(self, goal):
+        # entrance of the goal's cluster -> cost from it to the goal. Every npc chases the same goal, so this is
+        # only worked out again when the goal moves (or the map changes)
+        key = goal, self.game.map.version
+        if key != self.goal_edges_key:
+            _came_from, costs = self.search_cluster(goal)
+            self.goal_edges = {node: costs[node] for node in self.clusters[self.get_cluster(goal)] if node in costs}
+            self.goal_edges_key = key
+        return self.goal_edges
+
+
+    def build_clusters(self):
+        size = PATH_CLUSTER_SIZE
+        height, width = self.game.map.grid.shape
+        for cluster_y in range(-(-height // size)):
+            for cluster_x in range(-(-width // size)):
+                self.clusters[(cluster_x, cluster_y)]
+
+
+    def build_cluster(self, cluster):
+        # a cluster's graph: each of its entrances -> {where it can get to: cost}, that being the other entrances of
+        # the cluster (the shortest way inside it) and the tiles just across the border
+        cluster_x, cluster_y = cluster
+        crossings = {}  # entrance -> tiles across the border from it (two for an entrance in a corner)
+        for inside, outside in self.get_crossings(cluster_x, cluster_y, True) \
+                + self.get_crossings(cluster_x, cluster_y, False) \
+                + [(b, a) for a, b in self.get_crossings(cluster_x - 1, cluster_y, True)] \
+                + [(b, a) for a, b in self.get_crossings(cluster_x, cluster_y - 1, False)]:
+            crossings.setdefault(inside, []).append(outside)
+
+        graph = {}
+        for entrance, outside in crossings.items():
+            _came_from, costs = self.search_cluster(entrance)
+            graph[entrance] = {node: costs[node] for node in crossings if node in costs and node != entrance}
+            graph[entrance].update(dict.fromkeys(outside, 1))
+        return graph
+
+
+    def get_crossings(self, cluster_x, cluster_y, right):
+        # the entrances on the border of a cluster with the one right of it (or below it), as (tile in the cluster,
+        # tile across): every run of open tiles facing open tiles across the border is crossed in its middle, or at
+        # both ends when PATH_WIDE_ENTRANCE or more across. Both clusters ask this of their border, so they agree
+        size = PATH_CLUSTER_SIZE
+        tile_rows = self.game.map.tile_rows
+        height, width = len(tile_rows), len(tile_rows[0])
+        if right:
+            x = (cluster_x + 1) * size
+            if cluster_x < 0 or x >= width:
+                return []
+            pairs = [((x - 1, y), (x, y)) for y in range(cluster_y * size, min((cluster_y + 1) * size, height))]
+        else:
+            y = (cluster_y + 1) * size
+            if cluster_y < 0 or y >= height:
+                return []
+            pairs = [((x, y - 1), (x, y)) for x in range(cluster_x * size, min((cluster_x + 1) * size, width))]
+
+        crossings, run = [], []
+        for inside, outside in pairs:
+            if not tile_rows[inside[1]][inside[0]] and not tile_rows[outside[1]][outside[0]]:
+                run.append((inside, outside))
+                continue
+            crossings += self.run_crossings(run)
+            run = []
+        return crossings + self.run_crossings(run)
+
+
+    @staticmethod
+    def run_crossings(run):
+        if not run:
+            return []
+        return [run[0], run[-1]] if len(run) >= PATH_WIDE_ENTRANCE else [run[len(run) // 2]]
+
+
+    @staticmethod
+    def get_cluster(node):
+        return node[0] // PATH_CLUSTER_SIZE, node[1] // PATH_CLUSTER_SIZE
+
+
+
+def octile_distance(node, goal):
+    # the cost of the way from node to goal with no walls in between, 8-connected: diagonally until level with the
+    # goal on one axis, then straight
+    dx, dy = abs(node[0] - goal[0]), abs(node[1] - goal[1])
+    return dx + dy + (DIAGONAL_COST - 2) * min(dx, dy)
+
+
+
+class MovesDict(dict):
+    # PathFinding.moves_dict, filled in as searches reach tiles instead of for every open tile of the map up front
+    # (which on a big chunk map would be most of the map, none of it loaded yet). Walls have no moves
+    def __init__(self, pathfinding):
+        super().__init__()
+        self.pathfinding = pathfinding
+
+
+    def __missing__(self, node):
+        moves = self[node] = [] if self.pathfinding.game.map.get_tile(*node) else self.pathfinding.get_next_nodes(*node)
+        return moves
+
+
+
+class ClusterDict(dict):
+    # PathFinding.clusters: cluster (x, y) -> its graph of entrances (PathFinding.build_cluster), worked out the
+    # first time it's asked for, again after a tile in or next to it changes
+    def __init__(self, pathfinding):
+        super().__init__()
+        self.pathfinding = pathfinding
+
+
+    def __missing__(self, cluster):
+        graph = self[cluster] = self.pathfinding.build_cluster(cluster)
+        return graph
@@ -19,7 +19,7 @@ class Player:
         self.health = PLAYER_MAX_HEALTH
         self.rel_x = 0
         self.health_recovery_delay = RECOVERY_DELAY
-        self.time_prev = pg.time.get_ticks()
+        self.time_prev = game.ticks
 
 
     def recover_health(self):
@@ -28,26 +28,26 @@ class Player:
 
 
     def check_health_recovery_delay(self):
-        now = pg.time.get_ticks()
+        now = self.game.ticks
         if now - self.time_prev > self.health_recovery_delay:
             self.health_recovery_delay = now
             return True
 
 
     def check_game_over(self):
-        if self.health < 1:
+        if self.health < 1 and not self.game.restart:
             self.game.object_renderer.game_over()
             pg.display.flip()
             pg.time.delay(1500)
-            self.game.new_game()
+            self.game.restart = True    # Game.run_frame() starts the next game once this frame is done
 
 
-    def single_fire_event(self, event):
-        if event.type == MOUSEBUTTONDOWN:
-            if event.button == 1 and not self.fired and not self.game.weapon.reloading:
-                self.game.sound.shotgun.play()
-                self.fired = True
-                self.game.weapon.reloading = True
+    def single_fire_event(self):
+        # called by Game.check_events() on a left mouse click
+        if not self.fired and not self.game.weapon.reloading:
+            self.game.sound.shotgun.play()
+            self.fired = True
+            self.game.weapon.reloading = True
 
 
     def get_damage(self, damage):
@@ -69,7 +69,7 @@ class Player:
         speed_sin = speed * sin_a
         speed_cos = speed * cos_a
 
-        keys = pg.key.get_pressed()
+        keys = self.game.input.keys     # pg.key.get_pressed() for this frame, see Game.read_input()
 
         if keys[pg.K_w]:
             dx += speed_cos
@@ -101,7 +101,8 @@ class Player:
 
     def check_wall(self, x, y):
         # on the world_map, obstacles return True and open space returns False, as designed
-        return (x, y) not in self.game.map.world_map
+        # (tile_rows holds the same map as a dense grid; indexing it is cheaper than hashing an (x, y) tuple)
+        return not self.game.map.tile_rows[y][x]
 
 
     def check_wall_collision(self, dx, dy):
@@ -126,12 +127,8 @@ class Player:
     
 
     def mouse_control(self):
-        mx, my = pg.mouse.get_pos()
-
-        if mx < MOUSE_BORDER_LEFT or mx > MOUSE_BORDER_RIGHT:
-            pg.mouse.set_pos([HALF_WIDTH, HALF_HEIGHT])
-        # get relative x-coord mouse movement since previous frame
-        self.rel_x = pg.mouse.get_rel()[0]
+        # relative x-coord mouse movement since previous frame (Game.read_input() keeps the mouse off the border)
+        self.rel_x = self.game.input.rel_x
         # clamp this value between -MOUSE_MAX_REL and MOUSE_MAX_REL
         self.rel_x = max(-MOUSE_MAX_REL, min(MOUSE_MAX_REL, self.rel_x))
         # adjust player angle taking into account mouse sensitivity and delta time.
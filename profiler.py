@@ -0,0 +1,163 @@
+# std lib
+import csv
+from collections import deque
+from time import perf_counter_ns
+
+# pip install
+import numpy as np
+import pygame as pg
+
+# local
+from settings import *
+from raycasting import RayCasting
+from object_handler import ObjectHandler
+from object_renderer import ObjectRenderer
+from pathfinding import PathFinding
+from npc import NPC
+
+PROFILER_KEY = pg.K_F3  # toggles the overlay (see Game.read_input)
+
+# the methods timed, in the overlay's order. Nested ones (bfs in get_path, say) are timed inside their caller's time
+PROFILED = [
+    (RayCasting, 'update'),
+    (RayCasting, 'ray_cast'),
+    (RayCasting, 'get_objects_to_render'),
+    (ObjectHandler, 'update'),
+    (ObjectHandler, 'tick'),
+    (ObjectHandler, 'check_LOS'),
+    (NPC, 'player_has_LOS'),
+    (PathFinding, 'get_path'),
+    (PathFinding, 'bfs'),
+    (ObjectRenderer, 'draw'),
+    (ObjectRenderer, 'render_game_objects'),
+]
+
+# histogram bins of frame times per method: log-spaced, PROFILER_MIN_MS .. PROFILER_MAX_MS (outside that go in the ends)
+BIN_EDGES = np.logspace(np.log10(PROFILER_MIN_MS), np.log10(PROFILER_MAX_MS), PROFILER_BINS + 1)
+
+
+class Profiler:
+    # Per-frame timings of the PROFILED methods, off until toggled with PROFILER_KEY (or -profile <file.csv> on the
+    # command line, which also writes every frame to that file). While it's on, each of those methods is swapped on
+    # its class for a wrapper that adds its perf_counter_ns() time to the frame; while it's off the classes have their
+    # own methods back, so it costs nothing. Owned by Game, so it lasts across new_game()
+    def __init__(self, game, csv_path=None):
+        self.game = game
+        self.enabled = False
+        self.names = [f'{cls.__name__}.{method}' for cls, method in PROFILED]
+        self.originals = {}     # name -> the method the wrapper replaced, while enabled
+        # this frame so far: name -> ns, calls (a method can run several times a frame, or not at all)
+        self.frame_ns = dict.fromkeys(self.names, 0)
+        self.frame_calls = dict.fromkeys(self.names, 0)
+        # rolling histories, the last PROFILER_FRAMES frames: name -> ms per frame; 'frame' is the whole frame
+        self.history = {name: deque(maxlen=PROFILER_FRAMES) for name in ['frame'] + self.names}
+        self.calls = {name: deque(maxlen=PROFILER_FRAMES) for name in self.names}
+        self.last_frame = None  # perf_counter_ns() at the last end_frame()
+        self.font = None
+        self.csv_file = self.csv_writer = None
+        self.csv_path = csv_path
+        if csv_path:
+            self.toggle()
+
+
+    def toggle(self):
+        if self.enabled:
+            for (cls, method), name in zip(PROFILED, self.names):
+                setattr(cls, method, self.originals.pop(name))
+            self.close_csv()
+        else:
+            for (cls, method), name in zip(PROFILED, self.names):
+                self.originals[name] = getattr(cls, method)
+                setattr(cls, method, self.wrap(name, self.originals[name]))
+            if self.csv_path:
+                # append, so toggling off and on again goes on with the same file
+                self.csv_file = open(self.csv_path, 'a', newline='')
+                self.csv_writer = csv.writer(self.csv_file)
+                if not self.csv_file.tell():
+                    self.csv_writer.writerow(['frame_ms'] + [f'{name}_{column}' for name in self.names
+                                                             for column in ('ms', 'calls')])
+            self.font = self.font or pg.font.Font(None, PROFILER_FONT_SIZE)
+        self.enabled = not self.enabled
+        self.last_frame = None
+        for name in self.names:
+            self.frame_ns[name] = self.frame_calls[name] = 0
+
+
+    def wrap(self, name, method):
+        frame_ns, frame_calls = self.frame_ns, self.frame_calls
+
+        def timed(*args, **kwargs):
+            start = perf_counter_ns()
+            result = method(*args, **kwargs)
+            frame_ns[name] += perf_counter_ns() - start
+            frame_calls[name] += 1
+            return result
+        return timed
+
+
+    def end_frame(self):
+        # move this frame's times into the histories (and the csv file); the first frame after toggling on has no
+        # start time to measure the whole frame from, so it's left out
+        now = perf_counter_ns()
+        if self.last_frame is not None:
+            frame_ms = (now - self.last_frame) / 1e6
+            self.history['frame'].append(frame_ms)
+            row = [frame_ms]
+            for name in self.names:
+                ms = self.frame_ns[name] / 1e6
+                self.history[name].append(ms)
+                self.calls[name].append(self.frame_calls[name])
+                row += [ms, self.frame_calls[name]]
+            if self.csv_writer:
+                self.csv_writer.writerow(row)
+        self.last_frame = now
+        for name in self.names:
+            self.frame_ns[name] = self.frame_calls[name] = 0
+
+
+    def draw(self):
+        # once a frame, last thing before it's shown: a row per method with its mean, 95th percentile and worst
+        # ms per frame and calls per frame over the history, and the histogram of its ms per frame (log scale)
+        self.end_frame()
+        if not self.history['frame']:
+            return
+        font = self.font
+        line = font.get_linesize()
+        panel = pg.Surface((PROFILER_WIDTH, line * (len(self.history) + 1) + PROFILER_MARGIN * 2), pg.SRCALPHA)
+        panel.fill(PROFILER_BACKGROUND)
+        # columns: name, mean, p95, max, calls, histogram
+        name_width = max(font.size(name)[0] for name in self.history) + PROFILER_MARGIN
+        number_width = font.size('000.00 ')[0]
+        columns = [PROFILER_MARGIN] + [PROFILER_MARGIN + name_width + number_width * column for column in range(5)]
+        titles = '', 'mean', 'p95', 'max', 'calls', f'{PROFILER_MIN_MS}..{PROFILER_MAX_MS} ms'
+        for column, title in zip(columns, titles):
+            panel.blit(font.render(title, True, PROFILER_TEXT_COLOR), (column, PROFILER_MARGIN))
+
+        bar_width = (PROFILER_WIDTH - columns[-1] - PROFILER_MARGIN) / PROFILER_BINS
+        for row, (name, history) in enumerate(self.history.items(), 1):
+            y = PROFILER_MARGIN + row * line
+            times = np.array(history)
+            calls = f'{sum(self.calls[name]) / len(self.calls[name]):.1f}' if name in self.calls else ''
+            for column, text in zip(columns, (name, f'{times.mean():.2f}', f'{np.percentile(times, 95):.2f}',
+                                              f'{times.max():.2f}', calls)):
+                panel.blit(font.render(text, True, PROFILER_TEXT_COLOR), (column, y))
+            # frames the method didn't run in (0 ms) aren't in its histogram
+            counts = np.histogram(times[times > 0].clip(BIN_EDGES[0], BIN_EDGES[-1]), BIN_EDGES)[0]
+            if counts.any():
+                heights = counts / counts.max() * (line - 2)
+                for index, height in enumerate(heights.tolist()):
+                    if height:
+                        pg.draw.rect(panel, PROFILER_BAR_COLOR, (columns[-1] + index * bar_width, y + line - 1 - height,
+                                                                 max(bar_width - 1, 1), height))
+        self.game.screen.blit(panel, (0, 0))
+
+
+    def close_csv(self):
+        if self.csv_file:
+            self.csv_file.close()
+            self.csv_file = self.csv_writer = None
+
+
+    def close(self):
+        if self.enabled:
+            self.toggle()
@@ -0,0 +1,93 @@
+# std lib
+import atexit
+import os
+import signal
+from multiprocessing import Pool, RawArray
+
+# pip install
+import numpy as np
+
+# local
+from settings import *
+from raycasting import cast_ray_strip, carry_textures, dda_steps
+
+# rows of the shared results buffer, one column per ray (cast_ray_strip()'s results, all as float64)
+RESULT_ROWS = 6     # depth, proj_height, texture_num_vert, texture_num_hor, vert, offset
+
+
+class RayCastPool:
+    # RAY_CAST_BACKEND = 'multiprocess': a pool of worker processes that each cast one strip of screen columns.
+    # The map grid and the results live in shared memory, so a cast only sends the player's pose to the workers
+    # and they write their columns straight into the buffer the game reads. Owned by Game (the workers outlive
+    # new_game()); RayCasting hands it the map with set_grid()
+    def __init__(self, num_rays=NUM_RAYS, workers=RAY_CAST_WORKERS):
+        self.num_rays = num_rays
+        self.workers = workers or os.cpu_count()
+        # disjoint column ranges, one per worker
+        bounds = np.linspace(0, num_rays, self.workers + 1).astype(int).tolist()
+        self.strips = [(start, stop) for start, stop in zip(bounds, bounds[1:]) if start < stop]
+        self.results_buffer = RawArray('d', RESULT_ROWS * num_rays)
+        self.results = np.frombuffer(self.results_buffer).reshape(RESULT_ROWS, num_rays)
+        self.grid_buffer = self.grid = self.pool = None
+        # the map grid last copied in, and its version: a new game's Map starts counting versions again, so a
+        # version on its own doesn't tell a new map from the old one
+        self.grid_source = self.grid_version = None
+        atexit.register(self.close)
+
+
+    def set_grid(self, grid, version=0):
+        # share the map with the workers; a grid of another shape needs a new buffer and so new workers
+        if self.grid is not None and grid.shape == self.grid.shape:
+            if grid is not self.grid_source or version != self.grid_version:
+                self.grid[:] = grid
+                self.grid_source, self.grid_version = grid, version
+            return
+        self.close()
+        self.grid_buffer = RawArray('B', grid.size)
+        self.grid = np.frombuffer(self.grid_buffer, dtype=np.uint8).reshape(grid.shape)
+        self.grid[:] = grid
+        self.grid_source, self.grid_version = grid, version
+        self.pool = Pool(self.workers, initializer=init_worker,
+                         initargs=(self.grid_buffer, grid.shape, self.results_buffer, self.num_rays))
+
+
+    def cast(self, player_pos, player_map_pos, player_angle):
+        # (depth, proj_height, texture_num, offset) of every ray, exactly what RayCasting.ray_cast_numpy() gets
+        self.pool.starmap(cast_strip, [(start, stop, player_pos, player_map_pos, player_angle)
+                                       for start, stop in self.strips])
+        depth, proj_height, texture_num_vert, texture_num_hor, vert, offset = self.results.copy()
+        # the texture carry-over runs from ray to ray across the strips, so it's done here for all of them
+        texture_num = carry_textures(texture_num_vert.astype(np.uint8), texture_num_hor.astype(np.uint8), vert > 0)
+        return depth, proj_height, texture_num, offset
+
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        self.grid_buffer = self.grid = self.grid_source = None
+
+
+# the shared buffers as seen from inside a worker process, set up by init_worker()
+_grid = None
+_results = None
+
+
+def init_worker(grid_buffer, grid_shape, results_buffer, num_rays):
+    global _grid, _results
+    # forked after pygame.init(), so the workers start out with SDL's SIGINT / SIGTERM handlers, which only post a
+    # pg.QUIT event nobody here reads: a worker would then outlive Pool.terminate(). Ctrl+C is the game's to handle
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _grid = np.frombuffer(grid_buffer, dtype=np.uint8).reshape(grid_shape)
+    _results = np.frombuffer(results_buffer).reshape(RESULT_ROWS, num_rays)
+
+
+def cast_strip(start, stop, player_pos, player_map_pos, player_angle):
+    # columns start:stop of a cast, written into the shared results. The ray angles are summed up from the
+    # first column the same way ray_cast_numpy() does, so every worker gets bit-for-bit the same angles
+    # (FOV / num_rays is DELTA_ANGLE at the game's NUM_RAYS; benchmarks/ray_pool.py casts more)
+    num_rays = _results.shape[1]
+    ray_angles = dda_steps(np.array([player_angle - HALF_FOV + 0.0001]), np.array([FOV / num_rays]), num_rays - 1)[0]
+    _results[:, start:stop] = cast_ray_strip(_grid, player_pos, player_map_pos, player_angle, ray_angles[start:stop])
@@ -1,26 +1,149 @@
 # std lib
-from math import sin, cos
+from math import sin, cos, pi, tau
 
 # pip install
+import numpy as np
 import pygame as pg
 
 # local
 from settings import *
+from surface_cache import *
 
 class RayCasting:
     def __init__(self, game):
         self.game = game
         self.screen = game.screen
         self.world_map = game.map.world_map
+        self.tile_rows = game.map.tile_rows
+        self.grid = game.map.grid
+        self.rays = np.arange(NUM_RAYS)    # row index of every ray, used by the numpy backend
+
+        # frame coherence (FRAME_COHERENCE in settings.py) - see update() and rotate_rays()
+        self.last_pose = None
+        self.ray_base_angle = 0     # player angle the current rays were cast for
+        self.wall_objects = []      # the walls part of objects_to_render, reused while the pose doesn't change
+        # fish-eye correction factor of every ray column, relative to the player angle
+        self.cos_rel = np.cos(-HALF_FOV + 0.0001 + self.rays * DELTA_ANGLE)
+        self.frames_cast = 0        # counters: frames with a full ray cast,
+        self.frames_rotated = 0     # frames served by shifting the previous rays (pure rotation)
+        self.frames_reused = 0      # and frames that reused the previous rays and walls unchanged
 
         self.ray_casting_results = []
+        self.ray_arrays = None     # the same results as numpy columns, see get_ray_arrays()
+        self.visible_tiles = None  # tiles the rays can see, see get_visible_tiles()
         self.objects_to_render = []
         self.textures_dict = game.object_renderer.wall_textures_dict
+        # scaled wall slices of the 'slices' renderer, see get_objects_to_render()
+        self.slice_cache = SurfaceCache(WALL_SLICE_CACHE_MB * 2**20)
+
+        # WALL_RENDERER = 'buffer' draws every wall column straight into one screen-sized layer (see render_wall_layer())
+        if WALL_RENDERER == 'buffer':
+            self.wall_layer = pg.Surface(VIEW_RES)
+            self.wall_layer.set_colorkey(WALL_LAYER_COLORKEY)   # everything that isn't wall stays see-through
+            self.colorkey = self.wall_layer.map_rgb(WALL_LAYER_COLORKEY)
+            self.texture_array = self.get_texture_array()
+            # per-frame work buffers, one value per (screen row, ray)
+            self.screen_rows = np.arange(VIEW_HEIGHT, dtype=np.float32)[:, None]
+            self.texel_rows = np.empty((VIEW_HEIGHT, NUM_RAYS), dtype=np.float32)
+            self.texel_index = np.empty((VIEW_HEIGHT, NUM_RAYS), dtype=np.intp)
+            self.wall_pixels = np.empty((VIEW_HEIGHT, NUM_RAYS), dtype=self.texture_array.dtype)
+
+
+    def get_texture_array(self):
+        # All wall textures as one flat array of mapped pixels in the wall layer's format, laid out so that a
+        # single lookup returns the SCALE neighbouring texels one ray covers on screen: element
+        # [(texture_num * TEXTURE_SIZE + x) * (TEXTURE_SIZE + 2) + y + 1] holds texels x .. x + SCALE - 1 of row y.
+        # Each column is padded with one colorkey texel above and below, so rows off the wall need no masking
+        num_textures = max(self.textures_dict) + 1
+        padded = np.full((num_textures, TEXTURE_SIZE + SCALE, TEXTURE_SIZE + 2), self.colorkey, dtype=np.uint32)
+        for texture_num, texture in self.textures_dict.items():
+            padded[texture_num, :TEXTURE_SIZE, 1:-1] = pg.surfarray.array2d(texture.convert(self.wall_layer))
+        texels = np.stack([padded[:, shift:shift + TEXTURE_SIZE] for shift in range(SCALE)], axis=-1)
+        # one element per lookup; plain integers gather much faster than an opaque void type of the same size
+        element = {1: np.uint32, 2: np.uint64}.get(SCALE, np.dtype((np.void, texels.itemsize * SCALE)))
+        return texels.view(element).ravel()
+
+
+    def get_ray_arrays(self):
+        # (depth, proj_height, texture_num, offset) of every ray as numpy arrays; the numpy backend fills
+        # these in directly, for the python backend they're built from ray_casting_results on first use
+        if self.ray_arrays is None:
+            self.ray_arrays = tuple(np.array(column) for column in zip(*self.ray_casting_results))
+        return self.ray_arrays
+
+
+    def get_visible_tiles(self):
+        # The tiles the current rays pass through before they hit a wall, grown by one tile all round, as a bool
+        # array ([y, x]) over the part of map.grid they're in and the (x, y) tile of that part's top left corner.
+        # Found by sampling every ray each half tile up to its wall; the margin catches the tile corners the
+        # samples step over and sprites that stick out of their tile into view
+        if not self.get_ray_arrays():
+            return np.zeros((0, 0), bool), (0, 0)  # no rays cast yet (a new game's first frame): nothing in sight
+        if self.visible_tiles is None:
+            px, py = self.game.player.pos
+            rows, cols = self.grid.shape
+            # undo the fish-eye correction to get the distance along each ray
+            depth = self.get_ray_arrays()[0] / self.cos_rel
+            ray_angles = self.ray_base_angle - HALF_FOV + 0.0001 + self.rays * DELTA_ANGLE
+            samples = np.arange(0, min(depth.max(), rows + cols), 0.5)
+
+            seen = samples < depth[:, None]
+            xs = (px + np.cos(ray_angles)[:, None] * samples)[seen].astype(np.intp)
+            ys = (py + np.sin(ray_angles)[:, None] * samples)[seen].astype(np.intp)
+            inside = (xs >= 0) & (xs < cols) & (ys >= 0) & (ys < rows)
+            xs, ys = xs[inside], ys[inside]
+
+            # just the part of the map the samples landed in (plus the margin), not all of it
+            x0, y0 = max(xs.min() - 1, 0), max(ys.min() - 1, 0)
+            x1, y1 = min(xs.max() + 2, cols), min(ys.max() + 2, rows)
+            visible = np.zeros((y1 - y0, x1 - x0), bool)
+            visible[ys - y0, xs - x0] = True
+            grown = visible.copy()
+            grown[1:] |= visible[:-1]
+            grown[:-1] |= visible[1:]
+            visible = grown.copy()
+            visible[:, 1:] |= grown[:, :-1]
+            visible[:, :-1] |= grown[:, 1:]
+            self.visible_tiles = visible, (int(x0), int(y0))
+        return self.visible_tiles
+
+
+    def render_wall_layer(self):
+        # The same picture get_objects_to_render() builds from NUM_RAYS scaled subsurfaces, but as one gather
+        # from texture_array into the pixels of wall_layer, which the renderer then blits in one go
+        _depth, proj_height, texture_num, offset = self.get_ray_arrays()
+        proj_height = proj_height.astype(np.float32)
+
+        # texture column: the same SCALE-wide slice the subsurface path cuts out at 'offset'
+        tex_x = (offset * (TEXTURE_SIZE - SCALE)).astype(np.int32)
+        columns = (texture_num.astype(np.int32) * TEXTURE_SIZE + tex_x) * (TEXTURE_SIZE + 2)
+
+        # texture row: screen row y is (y - wall_top) / proj_height of the way down the wall, +1 for the padding.
+        # Clipping sends every row above/below the wall (sky and floor) to the colorkey padding texels
+        rows = self.texel_rows
+        np.subtract(self.screen_rows, VIEW_HALF_HEIGHT - proj_height / 2, out=rows)
+        np.multiply(rows, TEXTURE_SIZE / proj_height, out=rows)
+        np.add(rows, 1, out=rows)
+        np.clip(rows, 0, TEXTURE_SIZE + 1, out=rows)
+        np.copyto(self.texel_index, rows, casting='unsafe')
+        np.add(self.texel_index, columns, out=self.texel_index)
+        np.take(self.texture_array, self.texel_index, out=self.wall_pixels)
+
+        # pixels2d is a live [x, y] view of the surface (and locks it), so release it before the surface gets blitted
+        view = pg.surfarray.pixels2d(self.wall_layer)
+        view[:NUM_RAYS * SCALE].T[:] = self.wall_pixels.view(view.dtype).reshape(VIEW_HEIGHT, NUM_RAYS * SCALE)
+        del view
+
 
     # Call this method from the update() method
     def get_objects_to_render(self):
         self.objects_to_render = []
 
+        # the walls go to wall_layer instead; objects_to_render is then only filled with sprites
+        if WALL_RENDERER == 'buffer':
+            self.render_wall_layer()
+            return
+
         # generate a ray number 0+ and extract raycasting values to associate with the ray
         for ray, values in enumerate(self.ray_casting_results):
             depth, proj_height, texture_num, offset = values
@@ -29,28 +152,38 @@ class RayCasting:
             # offset will be 0, 1, or decimal in (0,1) - see 'render-slice.jpg'
             x, w = offset * (TEXTURE_SIZE - SCALE), SCALE
 
+            # scaled slices are cached by texture, column and projected height; rounding the height down to
+            # WALL_SLICE_QUANTUM px (scale() drops the fraction anyway) lets nearly identical frames share slices
+            proj_height = max(int(proj_height) // WALL_SLICE_QUANTUM, 1) * WALL_SLICE_QUANTUM
+            cache_key = texture_num, int(x), proj_height
+            wall_slice = self.slice_cache.get(cache_key)
+
             # As the depth of the ray approaches 0 (texture up close) the proj_height gets very large
             # this kills performance so we correct this by limiting the proj_height to the size of the display screen
-            if proj_height < HEIGHT:
+            if proj_height < VIEW_HEIGHT:
                 
-                # no height rescaling
-                y, h = 0, TEXTURE_SIZE
-                wall_slice = self.textures_dict[texture_num].subsurface(x, y, w, h)
+                if wall_slice is None:
+                    # no height rescaling
+                    y, h = 0, TEXTURE_SIZE
+                    wall_slice = self.textures_dict[texture_num].subsurface(x, y, w, h)
 
-                # scale to the width (SCALE) and projection height of the ray-rectangle
-                wall_slice = pg.transform.scale(wall_slice, (SCALE, proj_height))
+                    # scale to the width (SCALE) and projection height of the ray-rectangle
+                    wall_slice = pg.transform.scale(wall_slice, (SCALE, proj_height))
+                    self.slice_cache.put(cache_key, wall_slice)
 
                 # calc pos from ray number (x) and center texture on y-axis (ie, player POV stays on the same centered horizontal plane)
-                wall_pos = (ray * SCALE, HALF_HEIGHT - proj_height // 2)
+                wall_pos = (ray * SCALE, VIEW_HALF_HEIGHT - proj_height // 2)
 
             else:
-                # height rescaling using screen-projection ratio - see 'render-proj_height.jpg'
-                h = TEXTURE_SIZE * HEIGHT / proj_height
-                y = HALF_TEXTURE_SIZE - h // 2
-                wall_slice = self.textures_dict[texture_num].subsurface(x, y, w, h)
-
-                # now the projected height will not exceed the screen height
-                wall_slice = pg.transform.scale(wall_slice, (SCALE, HEIGHT))
+                if wall_slice is None:
+                    # height rescaling using screen-projection ratio - see 'render-proj_height.jpg'
+                    h = TEXTURE_SIZE * VIEW_HEIGHT / proj_height
+                    y = HALF_TEXTURE_SIZE - h // 2
+                    wall_slice = self.textures_dict[texture_num].subsurface(x, y, w, h)
+
+                    # now the projected height will not exceed the screen height
+                    wall_slice = pg.transform.scale(wall_slice, (SCALE, VIEW_HEIGHT))
+                    self.slice_cache.put(cache_key, wall_slice)
                 wall_pos = (ray * SCALE, 0)
 
             # now we have an object with attributes to render: add it to the list
@@ -58,13 +191,56 @@ class RayCasting:
 
 
     def ray_cast(self):
+        # RAY_CAST_BACKEND (settings.py) picks the per-ray loop, the all-rays-at-once numpy version or the worker pool
+        if RAY_CAST_BACKEND == 'numpy':
+            self.ray_cast_numpy()
+        elif RAY_CAST_BACKEND == 'multiprocess':
+            self.ray_cast_multiprocess()
+        else:
+            self.ray_cast_python()
+        self.ray_base_angle = self.game.player.angle
+
+
+    def ray_cast_numpy(self):
+        ray_angles = dda_steps(np.array([self.game.player.angle - HALF_FOV + 0.0001]),
+                               np.array([DELTA_ANGLE]), NUM_RAYS - 1)[0]
+        self.set_ray_arrays(*self.cast_rays(ray_angles))
+
+
+    def ray_cast_multiprocess(self):
+        # the numpy version, split into strips of columns cast by Game.ray_pool's worker processes
+        pool = self.game.ray_pool
+        pool.set_grid(self.grid, self.game.map.version)
+        self.set_ray_arrays(*pool.cast(self.game.player.pos, self.game.player.map_pos, self.game.player.angle))
+
+
+    def set_ray_arrays(self, depth, proj_height, texture_num, offset):
+        self.ray_arrays = depth, proj_height, texture_num, offset
+        self.visible_tiles = None
+        self.ray_casting_results = list(zip(depth.tolist(), proj_height.tolist(), texture_num.tolist(), offset.tolist()))
+
+
+    def cast_rays(self, ray_angles):
+        # Same algorithm as ray_cast_python() below (read that first, it has the commentary),
+        # but every ray is a row of an array and every grid intersection is a column (see cast_ray_strip()).
+        # Returns (depth, proj_height, texture_num, offset) arrays for the given ray angles
+        depth, proj_height, texture_num_vert, texture_num_hor, vert, offset = cast_ray_strip(
+            self.grid, self.game.player.pos, self.game.player.map_pos, self.game.player.angle, ray_angles)
+        return depth, proj_height, carry_textures(texture_num_vert, texture_num_hor, vert), offset
+
+
+    def ray_cast_python(self):
 
         # clear the ray casting results list before doing anything
         self.ray_casting_results = []
+        self.ray_arrays = None
+        self.visible_tiles = None
 
         # see '_tutorial/raycasting-overview.jpg'
         px, py = self.game.player.pos   # player.x + dx, player.y + dy e.g. (3.33, 0.22)
         map_x, map_y = self.game.player.map_pos     # int(player.x), int(player.y) e.g. (3, 0)
+        tile_rows = self.tile_rows
+        rows, cols = self.grid.shape
 
         # init/reset variables to avoid error
         texture_num_vert, texture_num_hor = 1, 1
@@ -95,10 +271,13 @@ class RayCasting:
             # now we have everything we need to cast a ray and find intersections with verticals
             for __ in range(MAX_DEPTH):
                 # now we can check if the tile of the vertical intersection is a wall:
-                tile_vert = int(x_vert), int(y_vert)
-                if tile_vert in self.world_map:
+                # (tile_rows is world_map as a dense grid, see map.py; 0 = open space)
+                # steep rays can land far off the map, which world_map simply treated as open space
+                tile_x, tile_y = int(x_vert), int(y_vert)
+                tile_vert = tile_rows[tile_y][tile_x] if 0 <= tile_y < rows and 0 <= tile_x < cols else 0
+                if tile_vert:
                     # get texture number from world_map grid, later used to retrieve texture from Dict
-                    texture_num_vert = self.world_map[tile_vert]
+                    texture_num_vert = tile_vert
                     break  # we've reached an obstacle
 
                 # if not we cast the ray to the next intersection
@@ -121,10 +300,11 @@ class RayCasting:
 
             for __ in range(MAX_DEPTH):
                 # check if the tile of the horizontal interesction is a wall
-                tile_hor = int(x_hor), int(y_hor)
-                if tile_hor in self.world_map:
+                tile_x, tile_y = int(x_hor), int(y_hor)
+                tile_hor = tile_rows[tile_y][tile_x] if 0 <= tile_y < rows and 0 <= tile_x < cols else 0
+                if tile_hor:
                     # get texture number from world_map grid, later used to retrieve texture from Dict
-                    texture_num_hor = self.world_map[tile_hor]
+                    texture_num_hor = tile_hor
                     break   # reached an obstacle
 
                 # extend ray to next horizontal intersection
@@ -177,7 +357,7 @@ class RayCasting:
 
 ####################################
             # DRAW WALLS  -  see 'raycasting-delta-rect.jpg'
-            # we use SCALE factor (settings.py) so we dont consider rays beyond screen RES (performance)
+            # we use SCALE factor (settings.py) so we dont consider rays beyond VIEW_RES (performance)
             # This amounts to distributing rays and hence the rectangles at 2px widths across the screen
             # this is all we need to convert our 2D raycast plane into 3 dimensions (turn off map.draw() and player.draw())
             # Also, a REALLY COOL FUNCTION for changing color based on a power of the depth variable, great illusion
@@ -186,7 +366,7 @@ class RayCasting:
             # Saving it here for future coding use:
 
             # color = [255 / (1 + depth ** 5 * 0.00002)] * 3
-            # pg.draw.rect(self.screen, color, (ray * SCALE, HALF_HEIGHT - proj_height // 2, SCALE, proj_height))
+            # pg.draw.rect(self.screen, color, (ray * SCALE, VIEW_HALF_HEIGHT - proj_height // 2, SCALE, proj_height))
 
             # DEBUG DRAW
             # This is for a topdown view of all rays being cast, must un-comment code to draw map and player, turn off renderer:
@@ -207,6 +387,145 @@ class RayCasting:
             ray_angle += DELTA_ANGLE
 
 
+    def rotate_rays(self, angle):
+        # Pure rotation: if the player turned by (close enough to) a whole number of rays, most of the rays we
+        # already have are still valid, they just belong to other columns. Shift them over and only cast the
+        # columns that turned into view. Returns False when the turn doesn't line up with the rays
+        shift = ((angle - self.ray_base_angle + pi) % tau - pi) / DELTA_ANGLE
+        n = round(shift)
+        if abs(shift - n) > RAY_REUSE_TOLERANCE or not 0 < abs(n) < NUM_RAYS:
+            return False
+
+        # new column j shows the ray old column j + n had
+        if n > 0:
+            old, new, fresh = slice(n, None), slice(None, -n), slice(-n, None)
+        else:
+            old, new, fresh = slice(None, n), slice(-n, None), slice(None, -n)
+
+        self.ray_base_angle += n * DELTA_ANGLE
+        ray_angles = self.ray_base_angle - HALF_FOV + 0.0001 + self.rays[fresh] * DELTA_ANGLE
+        arrays = [np.empty_like(array) for array in self.get_ray_arrays()]
+        for array, previous, cast in zip(arrays, self.get_ray_arrays(), self.cast_rays(ray_angles)):
+            array[new] = previous[old]
+            array[fresh] = cast
+
+        # depth was fish-eye corrected for the old column, so redo the correction for the new one
+        depth = arrays[0]
+        depth[new] *= self.cos_rel[new] / self.cos_rel[old]
+        arrays[1] = SCREEN_DIST / (depth + 0.0001)
+        self.set_ray_arrays(*arrays)
+        return True
+
+
     def update(self):
-        self.ray_cast()
-        self.get_objects_to_render()
\ No newline at end of file
+        pose = self.game.player.pos, self.game.player.angle, self.game.map.version
+
+        # Frame coherence: the walls only change when the player's pose (or the map) does
+        if FRAME_COHERENCE and pose == self.last_pose:
+            # same pose as last frame: last frame's rays and walls are still valid.
+            # Sprites get appended to objects_to_render every frame, so start it again from the walls alone
+            self.objects_to_render = self.wall_objects[:]
+            self.frames_reused += 1
+            return
+
+        if (FRAME_COHERENCE and self.last_pose and pose[0::2] == self.last_pose[0::2]
+                and self.rotate_rays(pose[1])):
+            self.frames_rotated += 1
+        else:
+            self.ray_cast()
+            self.frames_cast += 1
+
+        self.last_pose = pose
+        self.get_objects_to_render()
+        self.wall_objects = self.objects_to_render[:]
+
+
+def cast_ray_strip(grid, player_pos, player_map_pos, player_angle, ray_angles):
+    # RayCasting.cast_rays() on a plain grid and player pose, so worker processes can run it too (see ray_pool.py).
+    # Returns (depth, proj_height, texture_num_vert, texture_num_hor, vert, offset) for the given ray angles, with
+    # texture number 0 for rays that hit nothing: carry_textures() fills those in, which needs the rays to the left
+    px, py = player_pos
+    map_x, map_y = player_map_pos
+    rays = np.arange(len(ray_angles))
+
+    cos_a = np.cos(ray_angles)
+    sin_a = np.sin(ray_angles)
+
+    # VERTICALS - a row per ray, a column per intersection (MAX_DEPTH + 1 of them, see first_hit())
+    east = cos_a > 0
+    x_vert = np.where(east, map_x + 1, map_x - 1e-6)
+    dx = np.where(east, 1.0, -1.0)
+    depth_vert = (x_vert - px) / cos_a
+    y_vert = (depth_vert * sin_a) + py
+    delta_depth = dx / cos_a
+    dy = delta_depth * sin_a
+
+    x_vert, y_vert, depth_vert = dda_steps(x_vert, dx), dda_steps(y_vert, dy), dda_steps(depth_vert, delta_depth)
+    step, texture_num_vert = first_hit(grid, x_vert, y_vert)
+    depth_vert, y_vert = depth_vert[rays, step], y_vert[rays, step]
+
+    # HORIZONTALS
+    south = sin_a > 0
+    y_hor = np.where(south, map_y + 1, map_y - 1e-6)
+    dy = np.where(south, 1.0, -1.0)
+    depth_hor = (y_hor - py) / sin_a
+    x_hor = (depth_hor * cos_a) + px
+    delta_depth = dy / sin_a
+    dx = delta_depth * cos_a
+
+    x_hor, y_hor, depth_hor = dda_steps(x_hor, dx), dda_steps(y_hor, dy), dda_steps(depth_hor, delta_depth)
+    step, texture_num_hor = first_hit(grid, x_hor, y_hor)
+    depth_hor, x_hor = depth_hor[rays, step], x_hor[rays, step]
+
+    # DEPTH and TEXTURE OFFSET
+    vert = depth_vert < depth_hor
+    depth = np.where(vert, depth_vert, depth_hor)
+    y_vert %= 1
+    x_hor %= 1
+    offset = np.where(vert, np.where(east, y_vert, 1 - y_vert), np.where(south, 1 - x_hor, x_hor))
+
+    # fish-eye correction and PROJECTION
+    depth *= np.cos(player_angle - ray_angles)
+    proj_height = SCREEN_DIST / (depth + 0.0001)
+
+    return depth, proj_height, texture_num_vert, texture_num_hor, vert, offset
+
+
+def first_hit(grid, xs, ys):
+    # returns, per ray, the index of the first intersection that lands in a wall tile and that tile's texture.
+    # A ray that hits nothing within MAX_DEPTH ends one step past its last intersection, as in the loop, with texture 0
+    tiles = grid_lookup(grid, xs[:, :MAX_DEPTH], ys[:, :MAX_DEPTH])
+    hit = tiles > 0
+    step = np.where(hit.any(axis=1), hit.argmax(axis=1), MAX_DEPTH)
+    return step, tiles[np.arange(len(tiles)), step.clip(max=MAX_DEPTH - 1)] * (step < MAX_DEPTH)
+
+
+def carry_textures(texture_num_vert, texture_num_hor, vert):
+    # the texture of each ray's wall, from the side it hit. Like the loop, a ray that hit nothing on a side keeps
+    # that side's texture number from the last ray (to its left) that did hit something there, or 1 if none did
+    rays = np.arange(len(vert))
+    textures = []
+    for texture_num in texture_num_vert, texture_num_hor:
+        last_hit = np.where(texture_num > 0, rays, -1)
+        np.maximum.accumulate(last_hit, out=last_hit)
+        textures.append(np.where(last_hit >= 0, texture_num[last_hit], 1))
+    return np.where(vert, *textures)
+
+
+def dda_steps(first, step, steps=MAX_DEPTH):
+    # running sums first, first + step, first + 2*step, ... as a (len(first), steps + 1) array.
+    # np.cumsum adds strictly left to right, so each value is bit-for-bit what 'x += dx' gives in a loop
+    values = np.empty((len(first), steps + 1))
+    values[:, 0] = first
+    values[:, 1:] = step[:, None]
+    return np.cumsum(values, axis=1, out=values)
+
+
+def grid_lookup(grid, xs, ys):
+    # world_map-style lookup on a dense grid: int() the coords (truncating toward zero) and
+    # treat anything outside the grid as open space, just like a missing dict key
+    rows, cols = grid.shape
+    tile_x = xs.clip(-1, cols).astype(np.intp)
+    tile_y = ys.clip(-1, rows).astype(np.intp)
+    inside = (tile_x >= 0) & (tile_x < cols) & (tile_y >= 0) & (tile_y < rows)
+    return np.where(inside, grid[tile_y.clip(0, rows - 1), tile_x.clip(0, cols - 1)], 0)
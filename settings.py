@@ -1,11 +1,27 @@
 from math import pi, tan
 
 RES = WIDTH, HEIGHT = 1360, 768
-HALF_WIDTH = WIDTH // 2     # used for projection trig
-HALF_HEIGHT = HEIGHT // 2   # used for projection trig - this is the game's horizon
+HALF_WIDTH = WIDTH // 2
+HALF_HEIGHT = HEIGHT // 2
+# the 3-D view is drawn offscreen at RENDER_SCALE of the window and scaled up to it in one go; the HUD (health,
+# weapon, blood and end screens) is still drawn at RES. Rays, texturing and sprite projection all work in VIEW_RES
+RENDER_SCALE = 1    # e.g. 0.5 or 0.75 on slow machines
+RENDER_SMOOTH = False   # smoothscale the view up to the window (blurrier, and slower) instead of plain pixel scaling
+VIEW_RES = VIEW_WIDTH, VIEW_HEIGHT = int(WIDTH * RENDER_SCALE), int(HEIGHT * RENDER_SCALE)
+VIEW_HALF_WIDTH = VIEW_WIDTH // 2     # used for projection trig
+VIEW_HALF_HEIGHT = VIEW_HEIGHT // 2   # used for projection trig - this is the game's horizon
 TILEPX = 100    # 16x9 grid
 FPS = 60
 TIMER_MS = 60   # ms delay for repeating global signal event; used as an animation timer
+# npc ai, pathfinding and combat run in fixed steps of simulation time, however fast frames are drawn (see Game.simulate)
+SIM_RATE = 30   # simulation ticks per second
+SIM_DT = 1000 / SIM_RATE    # ms of simulation time per tick
+SIM_FRAMES = FPS / SIM_RATE # one tick stands in for this many frames at FPS: npc speeds are given per frame at FPS
+SIM_MAX_STEPS = 5   # ticks per frame at most; after a longer stall the simulation skips ahead instead of catching up
+# npc ai level of detail (see ObjectHandler.schedule_npcs): how often npcs get a tick, by what they're up to
+AI_LOD = True
+AI_TIER_INTERVALS = {'active': 1, 'idle': 4, 'dormant': 16, 'dead': 0}  # ticks between updates, 0 = never
+AI_DORMANT_DIST = 12    # tiles; idle npcs further from the player than this are dormant
 
 # movement - see also '_tutorial/player-movement.jpg'
 PLAYER_POS = 1.5, 7 # mini_map coords
@@ -27,17 +43,73 @@ MOUSE_BORDER_RIGHT = WIDTH - MOUSE_BORDER_LEFT
 # raycasting - see '_tutorial/raycasting-settings.jpg'
 FOV = pi / 3    # 60deg
 HALF_FOV = FOV / 2    # 30deg
-NUM_RAYS = WIDTH // 2    # large but arbitrary
-HALF_NUM_RAYS = WIDTH // 4
+NUM_RAYS = VIEW_WIDTH // 2    # large but arbitrary
+HALF_NUM_RAYS = NUM_RAYS // 2
 DELTA_ANGLE = FOV / NUM_RAYS    # angle between rays
 MAX_DEPTH = 20   # limit how many grid intersections to project (per x, y-axis)
+RAY_CAST_BACKEND = 'numpy'  # 'python' casts one ray at a time, 'numpy' casts every ray at once,
+                            # 'multiprocess' splits the screen into strips cast by worker processes (see ray_pool.py)
+RAY_CAST_WORKERS = 0    # worker processes for 'multiprocess'; 0 for one per CPU
+FRAME_COHERENCE = True  # reuse last frame's rays when the player hasn't moved (or has only turned, see below)
+RAY_REUSE_TOLERANCE = 0.1   # a turn within this fraction of a ray of a whole number of rays just shifts the rays over
+LOS_BACKEND = 'numpy'   # npc line of sight: 'python' has every npc cast its own ray, 'numpy' casts them all at once
+# with fewer living npcs than this numpy's per-call overhead costs more than the loops, so they cast their own rays:
+# the two break even at 12-16 npcs (benchmarks/los.py), so the shipped map's 8 npcs keep their own rays on purpose
+LOS_BATCH_MIN = 12
+# remember LOS per (player tile, npc tile) pair instead of casting every frame (see LOSCache in npc.py). Off: it casts
+# from tile middle to tile middle, which disagrees with the exact per-position LOS 4-5% of the time (benchmarks/los.py)
+LOS_CACHE = False
 
 # projection - see 'raycasting-projection-topdown.jpg'
-SCREEN_DIST = HALF_WIDTH / tan(HALF_FOV)
-SCALE = WIDTH // NUM_RAYS
+SCREEN_DIST = VIEW_HALF_WIDTH / tan(HALF_FOV)
+SCALE = VIEW_WIDTH // NUM_RAYS
 
 # texturing
 TEXTURE_SIZE = 256  # px
 HALF_TEXTURE_SIZE = TEXTURE_SIZE // 2
 FLOOR_COLOR = (30, 30, 30)
-DIGIT_RES = 72, 72  # digit image dimensions
\ No newline at end of file
+WALL_RENDERER = 'buffer'    # 'slices' blits a scaled subsurface per ray, 'buffer' draws all walls into one layer
+WALL_LAYER_COLORKEY = (255, 0, 255)  # see-through color of the 'buffer' wall layer; must not appear in wall textures
+WALL_SLICE_CACHE_MB = 32    # memory budget for scaled wall slices of the 'slices' renderer (least recently used go first)
+WALL_SLICE_QUANTUM = 1      # px; slice heights are rounded down to a multiple of this so similar heights share a slice
+DIGIT_RES = 72, 72  # digit image dimensions
+SPRITE_CACHE_MB = 48        # memory budget for scaled sprite images (least recently used go first)
+SPRITE_SCALE_STEP = 0.02    # sprite heights snap to steps of this fraction, so nearby distances share a scaled image
+FOV_CULLING = True  # only project sprites and npcs in the tiles the rays can see (see ObjectHandler.update)
+TEXTURE_CACHE_PATH = 'resources/textures.cache'    # pre-scaled textures kept between runs; None to always scale at startup
+ASSET_LOAD_WORKERS = 4  # threads decoding images and sounds behind the loading screen at launch; 0 to load them on demand
+ASSET_DIRS = 'resources/sprites', 'resources/textures', 'resources/sound'   # what the loading screen loads
+ASSET_EXTENSIONS = '.png', '.wav'   # (theme.mp3 is streamed by pg.mixer.music, not loaded)
+SOUND_EXTENSIONS = '.wav',
+LOADING_BAR_COLOR = (200, 200, 200)
+LOADING_BAR_HEIGHT = 24
+LOADING_FONT_SIZE = 48
+
+# npc pathfinding - 'bfs' searches from every moving npc every frame, 'astar' too but heads its searches for the
+# player rather than out in every direction, 'flow_field' keeps one search outward from the player that all npcs share,
+# 'hpa' searches from cluster to cluster of the map, tile by tile only at either end
+PATHFINDING = 'flow_field'
+PATH_MAX_EXPANSIONS = 2000  # 'astar': tiles expanded before a search settles for the closest it got; None: no limit
+PATH_CLUSTER_SIZE = 8       # 'hpa': tiles along a side of a cluster
+PATH_WIDE_ENTRANCE = 6      # 'hpa': openings between clusters this wide or wider are crossed at both ends, not the middle
+PATH_SEARCH_RADIUS = 32     # tiles; searches stay within this far of the player (the shipped map fits whole)
+
+# profiler overlay, toggled with F3 (-profile <file.csv> on the command line starts it on and also writes every
+# frame's times to that file): per-frame times of the methods in profiler.PROFILED
+PROFILER_FRAMES = 240       # frames the means, percentiles and histograms are over
+PROFILER_BINS = 30          # histogram bins, log-spaced from PROFILER_MIN_MS to PROFILER_MAX_MS
+PROFILER_MIN_MS = 0.01
+PROFILER_MAX_MS = 100
+PROFILER_WIDTH = 760
+PROFILER_MARGIN = 8
+PROFILER_FONT_SIZE = 24
+PROFILER_TEXT_COLOR = (255, 255, 255)
+PROFILER_BAR_COLOR = (0, 200, 0)
+PROFILER_BACKGROUND = (0, 0, 0, 160)
+
+# big worlds - play a chunk map file (written by chunk_map.py) instead of map.py's mini_map; None for mini_map
+MAP_PATH = None
+MAP_CHUNK_SIZE = 32     # tiles along a side of a chunk in the files chunk_map.py writes
+# chunks within this many tiles of the player are loaded: as far as rays, line of sight and the searches reach
+MAP_LOAD_RADIUS = max(MAX_DEPTH, PATH_SEARCH_RADIUS) + 2
+NPC_LOAD_RADIUS = 2     # and within this many of every npc that moves, wherever it is
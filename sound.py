@@ -1,16 +1,20 @@
 # pip install
 import pygame as pg
 
+# local
+from asset_cache import load_sound
+
 class Sound:
     def __init__(self, game):
         self.game = game
         pg.mixer.init()
         self.path = 'resources/sound/'
-        self.shotgun = pg.mixer.Sound(self.path + 'shotgun.wav')
-        self.npc_pain = pg.mixer.Sound(self.path + 'npc_pain.wav')
-        self.npc_death = pg.mixer.Sound(self.path + 'npc_death.wav')
-        self.npc_shot = pg.mixer.Sound(self.path + 'npc_attack.wav')
+        # the Sounds are shared with every new game, see asset_cache.py
+        self.shotgun = load_sound(self.path + 'shotgun.wav')
+        self.npc_pain = load_sound(self.path + 'npc_pain.wav')
+        self.npc_death = load_sound(self.path + 'npc_death.wav')
+        self.npc_shot = load_sound(self.path + 'npc_attack.wav')
         self.npc_shot.set_volume(0.2)
-        self.player_pain = pg.mixer.Sound(self.path + 'player_pain.wav')
+        self.player_pain = load_sound(self.path + 'player_pain.wav')
         self.theme = pg.mixer.music.load(self.path + 'theme.mp3')
         pg.mixer.music.set_volume(0.4)
\ No newline at end of file
@@ -0,0 +1,49 @@
+# pip install
+import numpy as np
+
+
+class SpatialGrid:
+    # Uniform grid over the map tiles: which objects stand in each tile, so a frame only has to look at the objects
+    # in the tiles it can see (see ObjectHandler.update) instead of every object on the map.
+    # Objects are sprites / npcs, filed under the tile of their x, y; moving objects call move() after they moved
+    def __init__(self, objects=()):
+        self.cells = {}     # (x, y) tile -> list of the objects in it
+        self.tiles = {}     # object -> the tile it's filed under
+        for obj in objects:
+            self.insert(obj)
+
+
+    def insert(self, obj):
+        tile = int(obj.x), int(obj.y)
+        self.cells.setdefault(tile, []).append(obj)
+        self.tiles[obj] = tile
+
+
+    def remove(self, obj):
+        tile = self.tiles.pop(obj)
+        cell = self.cells[tile]
+        cell.remove(obj)
+        if not cell:
+            del self.cells[tile]
+
+
+    def move(self, obj):
+        # refile obj if it crossed into another tile; cheap when it didn't, which is nearly every frame
+        if self.tiles[obj] != (int(obj.x), int(obj.y)):
+            self.remove(obj)
+            self.insert(obj)
+
+
+    def query(self, visible_tiles, origin=(0, 0)):
+        # the objects in the tiles where visible_tiles[y, x] is True: a bool array over the part of the map whose
+        # top left tile is origin (see RayCasting.get_visible_tiles).
+        # Walks whichever is shorter: the visible tiles, or the tiles that hold objects
+        x0, y0 = origin
+        rows, cols = visible_tiles.shape
+        ys, xs = np.nonzero(visible_tiles)
+        if len(xs) < len(self.cells):
+            cells = [self.cells.get(tile) for tile in zip((xs + x0).tolist(), (ys + y0).tolist())]
+        else:
+            cells = [cell for (x, y), cell in self.cells.items()
+                     if 0 <= y - y0 < rows and 0 <= x - x0 < cols and visible_tiles[y - y0, x - x0]]
+        return [obj for cell in cells if cell for obj in cell]
@@ -1,14 +1,20 @@
 # std lib
-from math import cos, atan2, hypot, pi
+from math import cos, atan2, hypot, pi, log, exp
 from collections import deque
-from os import listdir
-from os.path import isfile, join
 
 # pip install
 import pygame as pg
 
 # local
 from settings import *
+from asset_cache import *
+from surface_cache import *
+
+# Scaled sprite images, keyed by (source image, height bucket) and shared by every sprite and npc. Heights snap to
+# a geometric series (each bucket SPRITE_SCALE_STEP taller than the last, like mip levels) so the relative error is
+# the same near and far, and a sprite drifting through a bucket reuses one Surface instead of scaling every frame
+_projection_cache = SurfaceCache(SPRITE_CACHE_MB * 2**20)
+_BUCKET_LOG = log(1 + SPRITE_SCALE_STEP)
 
 class Sprite:
     def __init__(self, game, path='resources/sprites/static_sprites/candelabra.png', 
@@ -19,7 +25,7 @@ class Sprite:
         self.x, self.y = pos
         self.SPRITE_SCALE = scale
         self.SPRITE_HEIGHT_SHIFT = shift
-        self.image = pg.image.load(path).convert_alpha()
+        self.image = load_image(path)   # shared with every other sprite using this file, see asset_cache.py
         self.IMAGE_WIDTH = self.image.get_width()
         self.IMAGE_HALF_WIDTH = self.IMAGE_WIDTH // 2
         self.IMAGE_RATIO = self.IMAGE_WIDTH / self.image.get_height()
@@ -27,26 +33,40 @@ class Sprite:
         # init to avoid errors
         self.dx, self.dy, self.theta, self.screen_x, self.dist, self.norm_dist = 0, 0, 0, 0, 1, 1
         self.sprite_half_width = 0
+        self.in_view = True     # False when ObjectHandler's culling finds the sprite's tile out of sight
+        self.row = None         # the sprite's row in ObjectHandler's arrays, set by add_sprite / add_npc
 
 
     def update(self):
         self.get_sprite()
 
 
+    def read_projection(self, projection):
+        # angle to the player, where that puts the sprite on screen and its (fish-eye corrected) distance:
+        # our row of the projection ObjectHandler.project_sprites() worked out for all sprites at once, handed
+        # over by that handler (not looked up through game, which may have a new game's handler by now)
+        self.dx, self.dy, self.theta, self.screen_x, self.dist, self.norm_dist = projection[self.row]
+
+
     def get_sprite_projection(self):
 
         # as in raycasting we calc height of projection...
         proj = SCREEN_DIST / self.norm_dist * self.SPRITE_SCALE
-        # ... but we must take initial image aspect ratio into account so we rescale
-        proj_w, proj_h = proj * self.IMAGE_RATIO, proj
-        image = pg.transform.scale(self.image, (proj_w, proj_h))
+        # ... but we must take initial image aspect ratio into account so we rescale (or reuse a rescale, see above)
+        bucket = round(log(proj) / _BUCKET_LOG)
+        image = _projection_cache.get((self.image, bucket))
+        if image is None:
+            proj = exp(bucket * _BUCKET_LOG)
+            image = pg.transform.scale(self.image, (proj * self.IMAGE_RATIO, proj))
+            _projection_cache.put((self.image, bucket), image)
+        proj_w, proj_h = image.get_size()
 
         # HALF_WIDTH math because sprite has width dimension but screen_x is its center
         self.sprite_half_width = proj_w // 2
 
         height_shift = proj_h * self.SPRITE_HEIGHT_SHIFT
         x_offset = self.screen_x - self.sprite_half_width
-        y_offset = HALF_HEIGHT - proj_h // 2 + height_shift
+        y_offset = VIEW_HALF_HEIGHT - proj_h // 2 + height_shift
 
         pos = x_offset, y_offset
 
@@ -55,31 +75,9 @@ class Sprite:
 
 
     def get_sprite(self):
-        # angle between player and sprite is theta = arctan[(sy - py)/(sx - px))
-        # see 'player-sprite-delta_angle.jpg' and 'player-sprite-theta.jpg'
-        dx = self.x - self.player.x
-        dy = self.y - self.player.y
-        self.dx, self.dy = dx, dy
-        self.theta = atan2(dy, dx)  # atan2 ensures result is in correct quadrant [-pi, pi] over atan
-
-        delta = self.theta - self.player.angle
-
-        # due to signage in polar trig, if dx > 0 and player angle is > pi -OR- dx, dy both < 0, we have to add 2pi (tau)
-        if (dx > 0 and self.player.angle > pi) or (dx < 0 and dy < 0):
-            delta += 2 * pi
-
-        # how many rays fit in that delta angle is how many rays from the edge of our FOV
-        delta_rays = delta / DELTA_ANGLE
-
-        # add delta_rays to the central ray and multiply by scale to get the x-pos of sprite on screen
-        self.screen_x = (HALF_NUM_RAYS + delta_rays) * SCALE
-
-        # To calc size of projection for sprite, first calc distance; normalize to remove fish-lens effect
-        self.dist = hypot(dx, dy)
-        self.norm_dist = self.dist * cos(delta)
-
+        # (ObjectHandler.update() has already given us this frame's projection, see read_projection())
         # To maintain performance, we'll do certain things only while sprite is in view and not up close
-        if -self.IMAGE_HALF_WIDTH < self.screen_x < (WIDTH + self.IMAGE_HALF_WIDTH) and self.norm_dist > 0.5:
+        if self.in_view and -self.IMAGE_HALF_WIDTH < self.screen_x < (VIEW_WIDTH + self.IMAGE_HALF_WIDTH) and self.norm_dist > 0.5:
             self.get_sprite_projection()
 
 
@@ -91,7 +89,7 @@ class AnimatedSprite(Sprite):
         self.animation_time = animation_time
         self.path = path.rsplit('/', 1)[0]  # isolate the folder-path
         self.images = self.get_images(self.path)
-        self.animation_time_prev = pg.time.get_ticks()  # time since last frame
+        self.animation_time_prev = game.ticks  # time since last frame
         self.animation_trigger = False
 
 
@@ -107,9 +105,10 @@ class AnimatedSprite(Sprite):
             self.image = images[0]  # now 0 is next item in the queue
 
 
-    def check_animation_time(self):
+    def check_animation_time(self, now=None):
+        # 'now' defaults to the frame's time; npcs animate on simulation time instead (see NPC.tick)
         self.animation_trigger = False
-        now = pg.time.get_ticks()
+        now = self.game.ticks if now is None else now
         if now - self.animation_time_prev > self.animation_time:
             self.animation_time_prev = now
             self.animation_trigger = True
@@ -117,10 +116,5 @@ class AnimatedSprite(Sprite):
 
     def get_images(self, path):
         # we use deque for convenient rotation method
-        images = deque()
-        for file_name in listdir(path):
-            full_path = join(path, file_name)
-            if isfile(full_path):
-                img = pg.image.load(full_path).convert_alpha()
-                images.append(img)
-        return images
+        # the images are shared between all instances (asset_cache.py); each instance rotates its own deque of them
+        return deque(load_folder(path))
@@ -0,0 +1,46 @@
+# std lib
+from collections import OrderedDict
+
+class SurfaceCache:
+    # Least-recently-used store of pre-scaled Surfaces with a memory budget in bytes.
+    # Usage: surface = cache.get(key); if surface is None: surface = ...; cache.put(key, surface)
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.surfaces = OrderedDict()   # oldest first; a hit moves the key to the end
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, key):
+        surface = self.surfaces.get(key)
+        if surface is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+        return surface
+
+
+    def put(self, key, surface):
+        size = surface.get_pitch() * surface.get_height()
+        # a single surface bigger than the whole budget would just flush everything else
+        if size > self.max_bytes or key in self.surfaces:
+            return
+        self.surfaces[key] = surface
+        self.bytes += size
+        # evict least recently used surfaces until we're back under budget
+        while self.bytes > self.max_bytes:
+            _key, old = self.surfaces.popitem(last=False)
+            self.bytes -= old.get_pitch() * old.get_height()
+
+
+    def clear(self):
+        self.surfaces.clear()
+        self.bytes = 0
+
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
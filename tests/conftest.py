@@ -0,0 +1,8 @@
+# std lib
+import os
+
+# pytest loads this before the test modules, so it runs before any of them imports pygame (map.py and main do):
+# SDL picks its drivers when pygame initialises, and the dummy ones let the tests run without a display or sound card
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
@@ -0,0 +1,67 @@
+# Startup with a warm texture cache: everything that gets decoded at all is decoded by preload()'s threads behind
+# the loading screen, none of it on the main thread afterwards (asset_cache.preload() skips the images whose
+# scaled versions all come out of the texture cache, so nothing may load those at full size). And a restart
+# (Game.new_game() after a game over) reuses all of it: nothing is decoded again, on any thread
+# run from the repo root:  python -m pytest tests
+
+# std lib
+import json
+import os
+import subprocess
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the games below run in processes of their own, with a texture cache of their own (not the working tree's).
+# Every module takes TEXTURE_CACHE_PATH from settings when it's first imported, so it's set before anything else
+USE_CACHE = '''
+import settings
+settings.TEXTURE_CACHE_PATH = {path!r}
+'''
+
+# a game started with a cold cache: scales every texture and saves the cache, like running texture_cache.py
+BUILD_CACHE = '''
+from main import Game
+Game()
+'''
+
+# a game started and then lost, counting the files decoded on the main thread while it starts and on any thread
+# while it restarts
+COUNT_DECODES = '''
+import json
+import threading
+import pygame as pg
+import asset_cache
+decode = asset_cache.decode
+decodes = {'startup': [], 'restart': []}
+stage = 'startup'
+
+def counting_decode(path):
+    if stage == 'restart' or threading.current_thread() is threading.main_thread():
+        decodes[stage].append(path)
+    return decode(path)
+
+asset_cache.decode = counting_decode
+pg.time.delay = lambda ms: None     # (the game over screen stays up 1.5 s)
+from main import Game
+game = Game()
+stage = 'restart'
+game.player.health = 0
+game.player.check_game_over()       # as an npc's last shot does
+game.run_frame()
+assert not game.restart and game.player.health > 0
+print(json.dumps(decodes))
+'''
+
+
+def run(cache_path, code):
+    return subprocess.run([sys.executable, '-c', USE_CACHE.format(path=str(cache_path)) + code], cwd=REPO,
+                          capture_output=True, text=True, check=True).stdout
+
+
+def test_warm_start_and_restart_decode_nothing_more(tmp_path):
+    cache_path = tmp_path / 'textures.cache'
+    run(cache_path, BUILD_CACHE)
+    assert cache_path.exists()
+    decodes = json.loads(run(cache_path, COUNT_DECODES))
+    assert decodes == {'startup': [], 'restart': []}
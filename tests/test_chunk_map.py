@@ -0,0 +1,51 @@
+# Chunk maps (MAP_PATH): copying a chunk into Map.grid has to update everything worked out from the tiles that were
+# there before. A tile next to a chunk that isn't loaded yet sees open space (zeros) across the chunk border, so its
+# moves in PathFinding.moves_dict would walk through the chunk's walls if nothing forgot them when it loads
+# run from the repo root:  python -m pytest tests
+
+# std lib
+from types import SimpleNamespace
+
+# local
+import map as map_module
+from chunk_map import generate_map, write_chunk_map
+from pathfinding import PathFinding
+
+SIZE = 128
+
+
+def test_loading_a_chunk_updates_the_moves_next_to_it(tmp_path, monkeypatch):
+    path = str(tmp_path / 'world.map')
+    write_chunk_map(path, generate_map(SIZE, SIZE))
+    monkeypatch.setattr(map_module, 'MAP_PATH', path)
+    game = SimpleNamespace(object_handler=SimpleNamespace(npc_locations=set()))
+    game.map = map_module.Map(game)
+    game.pathfinding = PathFinding(game)
+
+    # the moves of every tile the player starts near, right up to the unloaded chunks around them
+    size = game.map.chunk_map.chunk_size
+    tiles = [(x, y) for chunk_x, chunk_y in game.map.loaded_chunks
+             for y in range(chunk_y * size, (chunk_y + 1) * size) for x in range(chunk_x * size, (chunk_x + 1) * size)]
+    before = {tile: game.pathfinding.moves_dict[tile] for tile in tiles}
+    assert len(game.map.loaded_chunks) < game.map.chunk_map.chunks_x * game.map.chunk_map.chunks_y
+
+    game.map.load_around(SIZE / 2, SIZE / 2, SIZE)   # the rest of the map
+    fresh = PathFinding(game)
+    after = {tile: fresh.moves_dict[tile] for tile in tiles}
+    assert {tile: game.pathfinding.moves_dict[tile] for tile in tiles} == after
+    assert before != after  # (some of them did see walls appear)
+
+
+def test_set_tile_outlasts_loading_its_chunk(tmp_path, monkeypatch):
+    path = str(tmp_path / 'world.map')
+    write_chunk_map(path, generate_map(SIZE, SIZE))
+    monkeypatch.setattr(map_module, 'MAP_PATH', path)
+    game_map = map_module.Map(None)
+    size = game_map.chunk_map.chunk_size
+    chunks = [(chunk_x, chunk_y) for chunk_y in range(game_map.chunk_map.chunks_y)
+              for chunk_x in range(game_map.chunk_map.chunks_x)]
+    chunk_x, chunk_y = next(chunk for chunk in chunks if chunk not in game_map.loaded_chunks)
+    x, y = chunk_x * size + 1, chunk_y * size + 1
+    game_map.set_tile(x, y, 3)
+    game_map.load_around(SIZE / 2, SIZE / 2, SIZE)   # the rest of the map
+    assert game_map.grid[y, x] == 3
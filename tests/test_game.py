@@ -0,0 +1,80 @@
+# Game over and victory both happen partway through Game.update() (an npc's shot in ObjectHandler.tick, the last npc
+# dying), and both have to lead into a new game that plays on from the next frame
+# run from the repo root:  python -m pytest tests
+
+# pip install
+import pygame as pg
+import pytest
+
+# local
+from main import Game
+from settings import PLAYER_MAX_HEALTH, SIM_DT
+
+FRAMES = 10     # enough for a few simulation ticks at any frame rate
+
+
+@pytest.fixture
+def game(monkeypatch):
+    monkeypatch.setattr(pg.time, 'delay', lambda ms: None)  # (the ending screens stay up 1.5 s)
+    return Game()
+
+
+def play(game, frames):
+    for _ in range(frames):
+        game.run_frame()
+
+
+def test_game_over_starts_a_new_game(game, monkeypatch):
+    play(game, FRAMES)
+    handler = game.object_handler
+    game.player.health = 0
+    for npc in handler.npc_list:
+        # the next npc to tick lands the last hit
+        monkeypatch.setattr(npc, 'tick', lambda: game.player.get_damage(0))
+    play(game, FRAMES)
+    assert game.object_handler is not handler
+    assert game.player.health == PLAYER_MAX_HEALTH
+
+
+def test_game_over_ends_the_ticks(game, monkeypatch):
+    # nothing more of the game that's over runs: not the other npcs of the tick, nor the frame's other ticks
+    play(game, FRAMES)
+    handler = game.object_handler
+    game.player.health = 0
+    ticks = []
+
+    def tick():
+        ticks.append(game.sim_time)
+        game.player.get_damage(0)
+    for npc in handler.npc_list:
+        monkeypatch.setattr(npc, 'tick', tick)
+    monkeypatch.setattr(handler, 'schedule_npcs', lambda: handler.npc_list)    # every npc's turn
+    game.sim_accumulator = SIM_DT * 3
+    game.run_frame()
+    assert len(ticks) == 1
+
+
+def test_victory_starts_a_new_game(game):
+    play(game, FRAMES)
+    handler = game.object_handler
+    for npc in handler.npc_list:
+        npc.alive = False
+    play(game, FRAMES)
+    assert game.object_handler is not handler
+    assert all(npc.alive for npc in game.object_handler.npc_list)
+
+
+def test_new_game_updates_before_its_first_cast(game):
+    # nothing has cast a ray yet, so with FOV_CULLING no sprite or npc is in sight
+    game.new_game()
+    game.object_handler.update()
+    assert not any(npc.in_view for npc in game.object_handler.npc_list)
+
+
+def test_old_objects_keep_their_own_projection(game):
+    # sprites and npcs read the projection of the handler that worked it out, even with a new game's handler in game
+    play(game, FRAMES)
+    handler = game.object_handler
+    game.new_game()
+    handler.tick()
+    handler.update()
@@ -0,0 +1,73 @@
+# NPC line of sight: batch_player_has_LOS() (LOS_BACKEND = 'numpy', ObjectHandler.check_LOS) has to give exactly what
+# NPC.player_has_LOS() gives for every npc, on the shipped map. Timings are in benchmarks/los.py
+# run from the repo root:  python -m pytest tests
+
+# std lib
+import random
+
+# pip install
+import pytest
+
+# local
+import object_handler
+from benchmarks.los import batch, place_everyone
+from main import Game
+
+PLACEMENTS = 2000
+
+
+@pytest.fixture(scope='module')
+def game():
+    return Game()
+
+
+def placements(game, count):
+    # the player and every npc at random spots on the floor, as benchmarks/los.py places them. Yields once per
+    # placement, with every npc's theta worked out
+    rng = random.Random(0)
+    floor = [(x, y) for y, row in enumerate(game.map.tile_rows) for x, tile in enumerate(row) if not tile]
+    for _ in range(count):
+        place_everyone(game, floor, game.object_handler.npc_list, rng)
+        yield
+
+
+def exact_LOS(npcs):
+    # player_has_LOS() of each npc; None where it can't answer (a ray straight along an axis: ZeroDivisionError)
+    results = []
+    for npc in npcs:
+        try:
+            results.append(npc.player_has_LOS())
+        except ZeroDivisionError:
+            results.append(None)
+    return results
+
+
+def test_batch_matches_player_has_LOS(game):
+    npcs = game.object_handler.npc_list
+    checked = 0
+    for _ in placements(game, PLACEMENTS):
+        for npc, has_LOS, expected in zip(npcs, batch(game, npcs), exact_LOS(npcs)):
+            if expected is not None:
+                checked += 1
+                assert has_LOS == expected, f'player {game.player.pos} npc {(npc.x, npc.y)}'
+    assert checked > PLACEMENTS * len(npcs) * 0.9
+
+
+def test_check_LOS_batch_path(game, monkeypatch):
+    # ObjectHandler.check_LOS() with every npc going through the batch, as it does with LOS_BATCH_MIN or more
+    monkeypatch.setattr(object_handler, 'LOS_CACHE', False)
+    monkeypatch.setattr(object_handler, 'LOS_BATCH_MIN', 0)
+    npcs = game.object_handler.npc_list
+    for _ in placements(game, PLACEMENTS // 10):
+        game.object_handler.check_LOS(npcs)
+        for npc, expected in zip(npcs, exact_LOS(npcs)):
+            if expected is not None:
+                assert npc.batch_LOS == expected
+
+
+def test_check_LOS_with_no_npcs(game, monkeypatch):
+    # a tick where AI_LOD has no living npc's turn still goes through the batch with LOS_BATCH_MIN = 0
+    monkeypatch.setattr(object_handler, 'LOS_CACHE', False)
+    monkeypatch.setattr(object_handler, 'LOS_BATCH_MIN', 0)
+    game.object_handler.check_LOS([])
+    assert batch(game, []) == []
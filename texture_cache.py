@@ -0,0 +1,150 @@
+# Persistent cache of decoded, pre-scaled images (TEXTURE_CACHE_PATH in settings.py).
+# Startup then maps the pixels of every scaled texture straight out of one raw file instead of decoding a PNG
+# and scaling it. Entries are keyed by source path, target size and filter and are only used while the source
+# file's mtime still matches, so editing an image or changing RES / TEXTURE_SIZE rebuilds them automatically.
+#
+# File layout: HEADER, a JSON index, then the raw RGBA pixels of each entry at the offset given in the index.
+# Build it ahead of time with:  python texture_cache.py   (the game also saves new entries after loading)
+
+# std lib
+import json
+import mmap
+import os
+import struct
+
+# pip install
+import pygame as pg
+
+# local
+from settings import *
+
+HEADER = struct.Struct('<4sBI')     # magic, version, length of the JSON index
+MAGIC = b'RCTX'
+VERSION = 1
+ALIGN = 64  # pixel data offsets are aligned to this many bytes
+
+
+class TextureCache:
+    def __init__(self, path):
+        self.path = path
+        self.index = {}     # key -> {'mtime_ns', 'width', 'height', 'offset'} of the entries in the file
+        self.used = set()   # keys of file entries handed out this run
+        self.new = {}       # key -> (mtime_ns, Surface) scaled this run, to be written by save()
+        self.file = self.map = None
+        self.open()
+
+
+    def open(self):
+        try:
+            self.file = open(self.path, 'rb')
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, index_size = HEADER.unpack_from(self.map)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError
+            self.index = json.loads(self.map[HEADER.size:HEADER.size + index_size])
+        except (OSError, ValueError, struct.error):
+            # no cache yet, or one we can't read: start empty, save() writes a fresh one
+            self.close()
+            self.index = {}
+
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        if self.file is not None:
+            self.file.close()
+        self.file = self.map = None
+
+
+    @staticmethod
+    def get_key(path, size, smooth):
+        return f'{path}|{size[0]}x{size[1]}|{"smooth" if smooth else "scale"}'
+
+
+    def get(self, path, size, smooth):
+        key = self.get_key(path, size, smooth)
+        entry = self.index.get(key)
+        if entry is None or self.map is None or entry['mtime_ns'] != os.stat(path).st_mtime_ns:
+            return None
+        self.used.add(key)
+
+        # frombuffer reads the mapped pixels in place; convert_alpha() makes the copy we keep
+        width, height, offset = entry['width'], entry['height'], entry['offset']
+        pixels = memoryview(self.map)[offset:offset + width * height * 4]
+        image = pg.image.frombuffer(pixels, (width, height), 'RGBA').convert_alpha()
+        pixels.release()
+        return image
+
+
+    def has_source(self, path):
+        # whether the file has a current entry at any size, which is all asset_cache.preload() can go by
+        mtime_ns = os.stat(path).st_mtime_ns
+        return any(key.split('|', 1)[0] == path and entry['mtime_ns'] == mtime_ns for key, entry in self.index.items())
+
+
+    def put(self, path, size, smooth, image):
+        self.new[self.get_key(path, size, smooth)] = os.stat(path).st_mtime_ns, image
+
+
+    def save(self):
+        # rewrite the file when something was added, or entries went unused (stale mtime, old RES, ...)
+        if not self.new and self.used == set(self.index):
+            return
+
+        entries = []    # (key, mtime_ns, width, height, pixel bytes)
+        for key in self.used:
+            entry = self.index[key]
+            size = entry['width'] * entry['height'] * 4
+            pixels = self.map[entry['offset']:entry['offset'] + size]
+            entries.append((key, entry['mtime_ns'], entry['width'], entry['height'], pixels))
+        for key, (mtime_ns, image) in self.new.items():
+            entries.append((key, mtime_ns, *image.get_size(), pg.image.tobytes(image, 'RGBA')))
+
+        # the offsets depend on the length of the index that holds them; pad it to a fixed size to break the loop
+        index = {key: {'mtime_ns': mtime_ns, 'width': width, 'height': height, 'offset': 0}
+                 for key, mtime_ns, width, height, _pixels in entries}
+        index_size = len(json.dumps(index)) + len(entries) * 16 + ALIGN
+        offset = -(-(HEADER.size + index_size) // ALIGN) * ALIGN
+        for key, _mtime_ns, _width, _height, pixels in entries:
+            index[key]['offset'] = offset
+            offset += -(-len(pixels) // ALIGN) * ALIGN
+        index_bytes = json.dumps(index).encode().ljust(index_size)
+
+        self.close()
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, index_size))
+            file.write(index_bytes)
+            for key, _mtime_ns, _width, _height, pixels in entries:
+                file.seek(index[key]['offset'])
+                file.write(pixels)
+        os.replace(temp_path, self.path)
+
+        self.open()
+        self.used = set(self.index)
+        self.new = {}
+
+
+# the cache for this process, opened on first use
+_texture_cache = None
+
+
+def get_texture_cache():
+    global _texture_cache
+    if _texture_cache is None and TEXTURE_CACHE_PATH:
+        _texture_cache = TextureCache(TEXTURE_CACHE_PATH)
+    return _texture_cache
+
+
+def save_texture_cache():
+    if _texture_cache is not None:
+        _texture_cache.save()
+
+
+if __name__ == '__main__':
+    # build step: load a game without a window (which scales and caches every texture) and save the cache
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    from main import Game
+    Game()
+    print(f'{TEXTURE_CACHE_PATH}: {len(get_texture_cache().index)} textures')
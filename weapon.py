@@ -3,10 +3,19 @@ from sprite_object import *
 
 class Weapon(AnimatedSprite):
     def __init__(self, game, path='resources/sprites/weapon/shotgun/0.png', scale=0.4, animation_time=90, damage=50):
-        super().__init__(game=game, path=path, scale=scale, animation_time=animation_time)
+        # Not AnimatedSprite.__init__(): that loads every frame at full size, and the weapon only ever draws them
+        # scaled. With the frames in the texture cache, load_scaled_image() doesn't decode anything, and the size
+        # to scale to comes from the first frame's file header
+        self.game = game
+        self.animation_time = animation_time
+        self.animation_time_prev = game.ticks
+        self.animation_trigger = False
+        self.path = path.rsplit('/', 1)[0]  # isolate the folder-path
+        width, height = get_image_size(path)
         self.images = deque(
-            [pg.transform.smoothscale(img, (self.image.get_width() * scale, self.image.get_height() * scale)) 
-                for img in self.images])
+            [load_scaled_image(img_path, (width * scale, height * scale), smooth=True)
+                for img_path in get_folder(self.path)])
+        self.image = self.images[0]
         # center the weapon on screen
         self.weapon_pos = (HALF_WIDTH - self.images[0].get_width() // 2, HEIGHT - self.images[0].get_height())
         self.reloading = False
@@ -17,7 +26,7 @@ class Weapon(AnimatedSprite):
 
     def animate_shot(self):
         if self.reloading:
-            self.game.player.fired = False
+            # (player.fired, the shot itself, is over after the next simulation tick, see ObjectHandler.tick)
             if self.animation_trigger:
                 # rotate the frames list but keep track of how many frames so we can stop appropriately
                 self.images.rotate(-1)